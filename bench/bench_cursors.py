@@ -0,0 +1,64 @@
+"""
+Cost of showing the cursors of collaborators: a number of clients move their cursors
+every few milliseconds for one second. Compares drawing every update right away (one rpc
+per update) with coalescing them per client & drawing at most g:AirLatexCursorFPS frames
+per second (one nvim_call_atomic per frame).
+Neovim is replaced by bench/headless.py.
+
+    python bench/bench_cursors.py [clients ...]
+"""
+import os
+import sys
+import random
+import asyncio
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from headless import HeadlessNvim
+from airlatex.util import init_logger
+from airlatex.documentbuffer import DocumentBuffer
+
+
+async def bench(name, num_clients, fps, duration=1, interval=0.005):
+    random.seed(num_clients)
+    nvim = HeadlessNvim({"g:AirLatexCursorFPS": fps})
+    buffer = DocumentBuffer([{"name": "Project", "handler": None}, {"name": "main.tex"}], nvim)
+    lines = ["lorem ipsum dolor sit amet über %i" % i for i in range(1000)]
+    buffer.write(lines)
+    while buffer.saved_buffer is None:
+        await asyncio.sleep(0)
+
+    # one rpc per update (no rate limit)
+    if not fps:
+        buffer.cursor_namespace = nvim.api.create_namespace("AirLatexCursors")
+        buffer.scheduleCursors = buffer.renderCursors
+
+    calls_before = sum(nvim.rpc_calls.values())
+    updates = 0
+    start = perf_counter()
+    while perf_counter() - start < duration:
+        for client in range(num_clients):
+            buffer.updateRemoteCursor({"id": "client%i" % client, "name": "User %i" % client, "row": random.randrange(1000), "column": random.randrange(40)})
+            updates += 1
+        await asyncio.sleep(interval)
+    await asyncio.sleep(1 / fps if fps else 0)
+    await asyncio.sleep(0)
+    elapsed = perf_counter() - start
+
+    rpc = sum(nvim.rpc_calls.values()) - calls_before
+    marks = nvim.extmarks.get(buffer.buffer.number, {})
+    assert len(marks) == num_clients and not buffer.cursor_updates
+    print("  %-26s %7i updates   %7i rpc   %6.1f rpc/s" % (name, updates, rpc, rpc / elapsed))
+
+
+async def main(sizes):
+    init_logger()
+    for num_clients in sizes:
+        print("%i collaborators" % num_clients)
+        await bench("every update", num_clients, 0)
+        await bench("coalesced, 10 fps", num_clients, 10)
+        await bench("coalesced, 30 fps", num_clients, 30)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1, 10, 50]
+    asyncio.run(main(sizes))
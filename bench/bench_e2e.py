@@ -0,0 +1,165 @@
+"""
+End-to-end benchmark of AirLatex against a local fake overleaf server (see fake_overleaf.py):
+- typing-to-ack latency: local change -> diff -> applyOtUpdate -> server ack
+- remote-op apply throughput: otUpdateApplied ops -> transformed & applied to the buffer
+- memory per open document
+The editor side is replaced by the in-process stand-ins of headless.py.
+
+    python bench/bench_e2e.py [--stats] [line counts ...]
+
+With --stats, the summary of :AirLatexStats is printed after every run.
+"""
+import os
+import sys
+import random
+import asyncio
+import tracemalloc
+from time import perf_counter
+from statistics import mean, median
+from fake_overleaf import FakeOverleaf, COOKIE
+from headless import HeadlessNvim, HeadlessSidebar
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex.util import init_logger
+from airlatex.stats import stats
+from airlatex.session import AirLatexSession
+from airlatex.documentbuffer import DocumentBuffer
+
+
+def makeText(num_lines):
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "\\section{Test}", "$x^2$", "über"]
+    return "\n".join(" ".join(random.choice(words) for _ in range(random.randint(0, 12))) for _ in range(num_lines))
+
+
+async def waitFor(condition, timeout=60):
+    start = perf_counter()
+    while not condition():
+        if perf_counter() - start > timeout:
+            raise TimeoutError("benchmark timed out")
+        await asyncio.sleep(0.0005)
+
+
+async def connect(server, port, nvim):
+    """
+    Logs in (using the session cookie) & connects the project like the sidebar does.
+    """
+    session = AirLatexSession("127.0.0.1:%i" % port, "", HeadlessSidebar(), nvim, https=False)
+    assert await session.login()
+    project = session.projectList[0]
+    await session.connectProject(project)
+    await waitFor(lambda: project.get("open"))
+    handler = project["handler"]
+
+    # notify waiting benchmarks whenever the server acknowledged an update
+    handler.acknowledged = asyncio.Event()
+    def acknowledgeOps(document, version=None, acknowledgeOps=handler.acknowledgeOps):
+        acknowledgeOps(document, version)
+        handler.acknowledged.set()
+    handler.acknowledgeOps = acknowledgeOps
+    return session, project, handler
+
+
+async def openDocument(project, nvim):
+    doc = project["tree"].root.docs[0]
+    buffer = DocumentBuffer([project, doc.data], nvim)
+    await project["handler"].joinDocument(buffer)
+    await waitFor(lambda: buffer.saved_buffer is not None)
+    return buffer
+
+
+def text(buffer):
+    return "\n".join(list.__iter__(buffer.buffer))
+
+
+async def benchTyping(buffer, handler, keystrokes):
+    latencies = []
+    calls_before = sum(buffer.nvim.rpc_calls.values())
+    row, col = len(buffer.saved_buffer) // 2, 0
+    for _ in range(keystrokes):
+        handler.acknowledged.clear()
+        start = perf_counter()
+        buffer.buffer.type(row, col, "x")
+        col += 1
+        buffer.writeBuffer(force=True)
+        await handler.acknowledged.wait()
+        latencies.append(perf_counter() - start)
+    rpc = (sum(buffer.nvim.rpc_calls.values()) - calls_before) / keystrokes
+    return latencies, rpc
+
+
+async def benchRemote(server, buffer, doc_id, num_ops):
+    doc = server.documents[doc_id]
+    start = perf_counter()
+    for _ in range(num_ops):
+        server.remoteUpdate(doc_id, [{"p": random.randint(0, len(doc.text)), "i": "y"}])
+    await waitFor(lambda: text(buffer) == doc.text)
+    return num_ops / (perf_counter() - start)
+
+
+async def benchConcurrent(server, buffer, handler, doc_id, num_ops):
+    """
+    Local typing interleaved with remote edits. Both sides have to converge.
+    """
+    doc = server.documents[doc_id]
+    for k in range(num_ops):
+        server.remoteUpdate(doc_id, [{"p": random.randint(0, len(doc.text)), "i": "r"}])
+        row = random.randrange(len(buffer.buffer))
+        buffer.buffer.type(row, 0, "l")
+        buffer.writeBuffer(force=True)
+        await asyncio.sleep(0)
+    await waitFor(lambda: text(buffer) == doc.text and all(d["inflight"] is None and not d["ops_buffer"] for d in handler.documents.values()))
+
+
+async def bench(num_lines, keystrokes=200, remote_ops=1000, show_stats=False):
+    random.seed(num_lines)
+    stats.reset()
+    server = FakeOverleaf({"main.tex": makeText(num_lines)})
+    port = server.listen()
+    doc_id = next(iter(server.documents))
+    nvim = HeadlessNvim({
+        "g:AirLatexUsername": "cookies:%s=%s" % (COOKIE, server.session),
+        "g:AirLatexAllowInsecure": 0,
+        "g:AirLatexWebsocketTimeout": 30,
+    })
+    session, project, handler = await connect(server, port, nvim)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = perf_counter()
+    buffer = await openDocument(project, nvim)
+    open_time = perf_counter() - start
+    memory = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+
+    latencies, rpc = await benchTyping(buffer, handler, keystrokes)
+    throughput = await benchRemote(server, buffer, doc_id, remote_ops)
+    await benchConcurrent(server, buffer, handler, doc_id, 100)
+
+    # reconnect & resume
+    start = perf_counter()
+    server.dropConnections()
+    buffer.buffer.type(0, 0, "offline ")
+    buffer.writeBuffer(force=True)
+    await waitFor(lambda: text(buffer) == server.documents[doc_id].text and handler.documents[doc_id]["inflight"] is None)
+    reconnect_time = perf_counter() - start
+
+    await handler.disconnect()
+    print("%8i lines | open %8.1f ms | mem %8.1f kB | type->ack mean %6.2f ms, median %6.2f ms, %5.1f rpc/key | remote %8.0f ops/s | reconnect %6.0f ms" % (
+        num_lines, open_time*1000, memory/1024, mean(latencies)*1000, median(latencies)*1000, rpc, throughput, reconnect_time*1000))
+    for name, timing in session.httpHandler.timings.items():
+        print("%8s       | %-32s %6i calls,   mean %6.2f ms, max %7.2f ms" % ("", name, timing["count"], timing["total"]/timing["count"]*1000, timing["max"]*1000))
+    for name, latency in handler.requests.stats()["latency"].items():
+        print("%8s       | %-32s %6i answers, mean %6.2f ms, max %7.2f ms" % ("", name, latency["count"], latency["mean"]*1000, latency["max"]*1000))
+    if show_stats:
+        print("\n".join(stats.format()) + "\n")
+
+
+async def main(sizes, show_stats):
+    init_logger()
+    for num_lines in sizes:
+        await bench(num_lines, show_stats=show_stats)
+
+
+if __name__ == "__main__":
+    show_stats = "--stats" in sys.argv
+    sizes = [int(a) for a in sys.argv[1:] if a != "--stats"] or [100, 1000, 10000]
+    asyncio.run(main(sizes, show_stats))
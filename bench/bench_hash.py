@@ -0,0 +1,82 @@
+"""
+Cost of the content hash sent with every keystroke on a ~1 MB document.
+
+    python bench/bench_hash.py [document size in bytes] [keystrokes]
+"""
+import os
+import sys
+import random
+from hashlib import sha1
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex.docstate import DocumentState
+
+
+def makeDocument(size):
+    lines, total = [], 0
+    while total < size:
+        line = "".join(random.choice("abcdefghij klmnopqrstuvwxyzäö") for _ in range(random.randint(0, 100)))
+        lines.append(line)
+        total += len(line.encode())+1
+    return lines
+
+
+# hashing as done before (full copy, quadratic concatenation)
+def hashConcat(lines):
+    current_len = 0
+    for row in lines:
+        current_len += len(row)+1
+    current_len -= 1
+    tohash = ("blob "+str(current_len) + "\x00")
+    for b in lines[:-1]:
+        tohash += b+"\n"
+    tohash += lines[-1]
+    sha = sha1()
+    sha.update(tohash.encode())
+    return sha.hexdigest()
+
+
+def keystrokes(lines, num):
+    for _ in range(num):
+        row = random.randrange(len(lines))
+        lines[row] = lines[row] + "x"
+        yield row
+
+
+def bench(name, lines, num, hash_fn):
+    lines = list(lines)
+    start = perf_counter()
+    for row in keystrokes(lines, num):
+        hash_fn(lines, row)
+    elapsed = perf_counter() - start
+    print("%-28s %10.3f ms / keystroke" % (name, elapsed / num * 1000))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 20
+    num = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    random.seed(0)
+    lines = makeDocument(size)
+    print("document: %i lines, %i bytes, %i keystrokes" % (len(lines), sum(len(l.encode())+1 for l in lines), num))
+
+    # check that both variants agree
+    state = DocumentState(list(lines))
+    assert hashConcat(lines) == state.hexdigest()
+
+    bench("concatenation (before)", lines, num, lambda lines, row: hashConcat(lines))
+
+    def cached(lines, row):
+        state.replace(row, row+1, lines[row:row+1])
+        state.hexdigest()
+    bench("cached blocks", lines, num, cached)
+
+    # typing ~10 keystrokes per second => hash is due every 50th keystroke
+    DocumentState.interval = 0
+    count = 0
+    def due(lines, row):
+        global count
+        state.replace(row, row+1, lines[row:row+1])
+        count += 1
+        if count % 50 == 0:
+            state.hexdigestIfDue()
+    bench("cached blocks, every 5s", lines, num, due)
@@ -0,0 +1,76 @@
+"""
+Cost of the log statements on the hot paths (per call, on the calling thread):
+eager string building (before) vs. lazy %-style arguments, with logging disabled
+(g:AirLatexLogLevel = NOTSET) and with debug logging to a file, written directly or
+through the background queue.
+
+    python bench/bench_logging.py [calls]
+"""
+import os
+import sys
+import json
+import logging
+import tempfile
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex import util
+from airlatex.util import init_logger, logging_settings
+
+update = {"doc": "0"*24, "op": [{"p": 12345, "i": "x"}], "v": 1234, "meta": {"source": "P.other", "user_id": "u"*24, "ts": 1600000000000}}
+message = json.dumps({"name": "applyOtUpdate", "args": ["0"*24, update]})
+frame = "5:::" + json.dumps({"name": "otUpdateApplied", "args": [update]})
+
+
+class CustomLogRecord(logging.LogRecord):
+    # record factory used before (computes the origin for every record)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filename = self.filename.split(".")[0]
+        self.origin = f"{self.filename} / {self.funcName} #{self.lineno:<4}"
+
+
+def eager(log):
+    log.debug("got ops:"+str(update))
+    log.debug("Sending update: "+message)
+    log.debug("Raw server answer: "+frame)
+    log.debug_gui("bufferDo cmd="+"applyUpdate")
+
+
+def lazy(log):
+    log.debug("got ops: %s", update)
+    log.debug("Sending update: %s", message)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Raw server answer: %s", frame)
+    log.debug_gui("bufferDo cmd=%s", "applyUpdate")
+
+
+def bench(name, fn, log, calls):
+    start = perf_counter()
+    for _ in range(calls):
+        fn(log)
+    elapsed = perf_counter() - start
+    util._stopLogListener()
+    print("  %-34s %8.3f us / statement" % (name, elapsed / calls / 4 * 1e6))
+
+
+def setup(level, queue, file):
+    logging.setLogRecordFactory(logging.LogRecord)
+    logging_settings.update({"level": level, "queue": queue, "file": file})
+    return init_logger()
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    file = os.path.join(tempfile.mkdtemp(), "AirLatex.log")
+
+    print("logging disabled")
+    bench("eager (before)", eager, setup("NOTSET", False, file), calls)
+    bench("lazy", lazy, setup("NOTSET", False, file), calls)
+
+    print("debug logging to a file")
+    log = setup("DEBUG", False, file)
+    logging.setLogRecordFactory(CustomLogRecord)
+    log.handlers[0].setFormatter(logging.Formatter('%(origin)40s: %(message)s'))
+    bench("eager, origin per record (before)", eager, log, calls)
+    bench("lazy, file handler", lazy, setup("DEBUG", False, file), calls)
+    bench("lazy, queue", lazy, setup("DEBUG", True, file), calls)
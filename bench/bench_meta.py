@@ -0,0 +1,83 @@
+"""
+Reading the project list from the dashboard: regex over the whole decoded page (before)
+vs. airlatex.metaextract fed with the chunks of the response, dropping the chunks after the meta tags.
+
+    python bench/bench_meta.py [projects ...] [chunk size]
+
+The synthesized dashboard resembles the overleaf page: some meta tags in the head, the
+(html-escaped) project list, the user id and a large body of markup & scripts after it.
+"""
+import os
+import re
+import sys
+import json
+import html
+import random
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex.metaextract import MetaExtractor
+
+
+def synthesizePage(num_projects, body_size=2*10**6):
+    random.seed(0)
+    projects = [{
+        "id": "%024x" % i,
+        "name": "Project \"%i\" <Ünïcode & more>" % i,
+        "lastUpdated": "2020-10-%02iT12:00:00.000Z" % (i % 28 + 1),
+        "accessLevel": random.choice(["owner", "readAndWrite", "readOnly"]),
+        "source": "owner",
+        "archived": False,
+        "trashed": False,
+        "owner_ref": "%024x" % 7,
+        "owner": {"_id": "%024x" % 7, "email": "some.one@example.com", "first_name": "Some", "last_name": "One"},
+        "lastUpdatedBy": {"_id": "%024x" % 8, "email": "other@example.com", "first_name": "Other", "last_name": ""},
+    } for i in range(num_projects)]
+    head = "".join('<meta name="ol-setting%i" content="%s">\n' % (i, html.escape(json.dumps({"value": i}))) for i in range(30))
+    body = "<div class=\"row\"><span>&nbsp;</span><script>var x = '<meta>';</script></div>\n" * (body_size // 70)
+    page = ('<!DOCTYPE html><html><head><title>Your Projects</title>\n%s'
+            '<meta name="ol-user_id" content="%s">\n'
+            '<meta name="ol-projects" data-type="json" content="%s">\n'
+            '</head><body>%s</body></html>') % (head, "%024x" % 7, html.escape(json.dumps(projects)), body)
+    return page.encode(), projects
+
+
+def before(page, chunk_size):
+    text = b"".join(page[i:i+chunk_size] for i in range(0, len(page), chunk_size)).decode("utf8")
+    meta = re.search('<meta\s[^>]*name="ol-projects"[^>]*>', text)
+    project_data_escaped = re.search('content="([^"]*)"',meta[0])[1]
+    user_meta = re.search('<meta\s[^>]*name="ol-user_id"[^>]*>', text)
+    user_id = re.search('content="([^"]*)"',user_meta[0])[1] if user_meta else None
+    return json.loads(html.unescape(project_data_escaped)), user_id, len(page)
+
+
+def after(page, chunk_size):
+    extractor = MetaExtractor(["ol-projects", "ol-user_id"])
+    scanned = 0
+    for i in range(0, len(page), chunk_size):
+        chunk = page[i:i+chunk_size]
+        scanned += len(chunk)
+        if extractor.feed(chunk):
+            break
+    return json.loads(extractor.found["ol-projects"]), extractor.found["ol-user_id"], scanned
+
+
+def bench(name, page, chunk_size, fn, repetitions):
+    start = perf_counter()
+    for _ in range(repetitions):
+        result = fn(page, chunk_size)
+    elapsed = (perf_counter() - start) / repetitions
+    print("  %-28s %8.2f ms   %6.2f MB scanned" % (name, elapsed*1000, result[2]/1e6))
+    return result
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    sizes = args[:-1] if len(args) > 1 else args or [100, 1000, 5000]
+    chunk_size = args[-1] if len(args) > 1 else 64*1024
+    for num in sizes:
+        page, projects = synthesizePage(num)
+        print("%i projects, page of %.2f MB, chunks of %i bytes" % (num, len(page)/1e6, chunk_size))
+        repetitions = max(1, 200 // num)
+        a = bench("regex (before)", page, chunk_size, before, repetitions)
+        b = bench("streaming MetaExtractor", page, chunk_size, after, repetitions)
+        assert a[0] == b[0] == projects and a[1] == b[1]
@@ -0,0 +1,91 @@
+"""
+Time to open a document of the given number of lines, from the joinDoc answer to a filled buffer:
+per line decoding & one append per line (before) vs. bulk decoding & one nvim_buf_set_lines,
+as well as progressive loading (time until the first screenful is shown).
+
+    python bench/bench_open.py [lines ...]
+
+Neovim is replaced by bench/headless.py, thus the times do not include the editor's side of
+the RPCs. Their number is given instead (each costs a roundtrip to neovim). With progressive
+loading, the remaining chunks are written with pauses (DocumentBuffer.stream_pause), in which
+neovim redraws & handles input: the total time is longer, but the editor is never blocked by
+one large nvim_buf_set_lines.
+"""
+import os
+import sys
+import random
+import asyncio
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from headless import HeadlessNvim
+from airlatex.util import init_logger
+from airlatex.documentbuffer import DocumentBuffer
+from airlatex.docstate import DocumentState
+
+
+def makeLines(num_lines):
+    random.seed(num_lines)
+    words = ["lorem", "ipsum", "@article{key,", "author = {Müller, Jürgen},", "title = {Über}", "}", "$x^2$"]
+    lines = [" ".join(random.choice(words) for _ in range(random.randint(0, 12))) for _ in range(num_lines)]
+
+    # as sent by the server: utf8 bytes in latin1
+    return [l.encode("utf8").decode("latin1") for l in lines]
+
+
+async def openBefore(nvim, data):
+    buffer = DocumentBuffer([{"name": "Project", "handler": None}, {"name": "main.bib"}], nvim)
+    lines = [d.encode("latin1").decode("utf8") for d in data]
+    buffer.buffer[0] = lines[0]
+    for l in lines[1:]:
+        buffer.buffer.append(l)
+    buffer.saved_buffer = DocumentState(buffer.buffer[:])
+    buffer.popChangedRegion()
+    return buffer
+
+
+async def openAfter(nvim, data):
+    buffer = DocumentBuffer([{"name": "Project", "handler": None}, {"name": "main.bib"}], nvim)
+    buffer.write("\n".join(data).encode("latin1").decode("utf8").split("\n"))
+    while buffer.saved_buffer is None:
+        await asyncio.sleep(0)
+    return buffer
+
+
+async def bench(name, data, open, progressive=0, screen=50):
+    nvim = HeadlessNvim({"g:AirLatexProgressiveLoad": progressive})
+
+    # time until the buffer holds a screenful of lines
+    first = []
+    start = perf_counter()
+    original = nvim.command
+    def command(cmd):
+        original(cmd)
+        if cmd == "enew":
+            buffer = nvim.current.buffer
+            def replace(*args, replace=buffer._replace):
+                replace(*args)
+                if not first and len(buffer) >= screen:
+                    first.append(perf_counter())
+            buffer._replace = replace
+    nvim.command = command
+
+    buffer = await open(nvim, data)
+    elapsed = perf_counter() - start
+    rpc = sum(nvim.rpc_calls.values())
+    assert buffer.buffer[:] == list(buffer.saved_buffer) == [d.encode("latin1").decode("utf8") for d in data]
+    print("  %-26s %9.2f ms   first screen %9.2f ms   %6i rpc" % (name, elapsed*1000, (first[0] - start)*1000, rpc))
+
+
+async def main(sizes):
+    init_logger()
+    for num_lines in sizes:
+        data = makeLines(num_lines)
+        print("%i lines" % num_lines)
+        await bench("per line (before)", data, openBefore)
+        await bench("bulk", data, openAfter)
+        await bench("progressive (200 lines)", data, openAfter, progressive=200)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 20000, 100000]
+    asyncio.run(main(sizes))
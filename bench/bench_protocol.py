@@ -0,0 +1,90 @@
+"""
+Parse cost per incoming socket.io frame: regex header + json (before) vs. airlatex.protocol.
+
+    python bench/bench_protocol.py [recorded frames file] [repetitions]
+
+A recorded stream contains one raw frame per line (e.g. the "Raw server answer" lines
+of a log file, with the prefix removed). Without a file, a typical editing session is
+synthesized: joining a project & a 5000 line document, then mostly otUpdateApplied,
+cursor updates, acks and keep alives.
+"""
+import os
+import re
+import sys
+import json
+import random
+from time import perf_counter
+from collections import Counter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex import protocol
+from airlatex.protocol import parseFrame, loads
+
+codere = re.compile(r"(\d):(?:(\d+)(\+?))?:(?::(?:(\d+)(\+?))?(.*))?")
+
+
+def synthesizeFrames(num=20000):
+    random.seed(0)
+    project = {"_id": "p"*24, "name": "Project", "rootFolder": [{"_id": "f"*24, "name": "rootFolder", "folders": [],
+               "docs": [{"_id": "%024i" % i, "name": "doc%i.tex" % i} for i in range(50)], "fileRefs": []}]}
+    lines = ["".join(random.choice("abcdefghij klmnop\\{}$") for _ in range(random.randint(0, 80))) for _ in range(5000)]
+    frames = [
+        "1::",
+        "5:::" + json.dumps({"name": "connectionAccepted", "args": [None, "P.abcdef"]}),
+        "6:::1+" + json.dumps([None, project, "owner", 2]),
+        "6:::2+" + json.dumps([None, lines, 1234, [], {}]),
+    ]
+    for i in range(num):
+        r = random.random()
+        if r < 0.6:
+            frames.append("5:::" + json.dumps({"name": "otUpdateApplied", "args": [{"doc": "0"*24, "op": [{"p": random.randint(0, 10**5), "i": "x"}], "v": 1234+i, "meta": {"source": "P.other", "user_id": "u"*24, "ts": 1600000000000}}]}))
+        elif r < 0.8:
+            frames.append("5:::" + json.dumps({"name": "clientTracking.clientUpdated", "args": [{"row": random.randint(0, 5000), "column": 3, "doc_id": "0"*24, "id": "P.other", "user_id": "u"*24, "name": "Some One"}]}))
+        elif r < 0.95:
+            frames.append("6:::%i+[]" % (i+3))
+        else:
+            frames.append("2::")
+    return frames
+
+
+def parseBefore(msg):
+    text = "Raw server answer: "+msg
+    code, await_id, await_mult, answer_id, answer_mult, data = codere.match(msg).groups()
+    if data:
+        data = json.loads(data)
+    return code, answer_id or "", data or None
+
+
+def parseAfter(msg):
+    code, msg_id, endpoint, answer_id, data = parseFrame(msg)
+    if data:
+        data = loads(data)
+    return code, answer_id, data or None
+
+
+def bench(name, frames, repetitions, parse):
+    start = perf_counter()
+    for _ in range(repetitions):
+        for msg in frames:
+            parse(msg)
+    elapsed = perf_counter() - start
+    print("%-40s %8.2f us / frame" % (name, elapsed / repetitions / len(frames) * 1e6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            frames = [l.rstrip("\n") for l in f if l.strip()]
+    else:
+        frames = synthesizeFrames()
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print("%i frames, %.1f MB, codes: %s" % (len(frames), sum(map(len, frames))/1e6, dict(Counter(f[0] for f in frames))))
+
+    # both variants have to agree
+    for msg in frames:
+        assert parseBefore(msg) == parseAfter(msg)
+
+    bench("header: regex (before)", frames, repetitions, lambda msg: codere.match(msg).groups())
+    bench("header: parseFrame", frames, repetitions, parseFrame)
+    bench("regex + json (before)", frames, repetitions, parseBefore)
+    bench("parseFrame + %s" % protocol.loads.__module__, frames, repetitions, parseAfter)
+    bench("parseFrame + json", frames, repetitions, lambda msg: (lambda c, i, e, a, d: json.loads(d) if d else d)(*parseFrame(msg)))
@@ -0,0 +1,83 @@
+"""
+Randomized checks of the op handling in airlatex/ot.py:
+- composeOps: the composed op has the same effect as the original components
+  (and is never longer)
+- transformOps: concurrent ops converge,
+      apply(apply(doc, left), right') == apply(apply(doc, right), left')
+
+    python bench/check_ot.py [cases] [seed]
+
+Exits with an error on the first counterexample (printed to reproduce it).
+"""
+import os
+import sys
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from fake_overleaf import applyOp
+from airlatex.ot import composeOps, transformOps
+
+
+def randomOp(text, max_components=6):
+    """
+    Components that are valid one after another on text (typing-like & random edits).
+    """
+    op = []
+    for _ in range(random.randint(0, max_components)):
+
+        # edits close to the last component are likely (merging cases)
+        if op and random.random() < 0.6:
+            p = min(max(op[-1]["p"] + random.randint(-3, 3), 0), len(text))
+        else:
+            p = random.randint(0, len(text))
+        if random.random() < 0.5 or p == len(text):
+            c = {"p": p, "i": "".join(random.choice("ab\nü") for _ in range(random.randint(1, 3)))}
+        else:
+            c = {"p": p, "d": text[p:p+random.randint(1, 4)]}
+        text = applyOp(text, [c])
+        op.append(c)
+    return op
+
+
+def apply(doc, *ops):
+    """
+    Document after applying the ops (None if a delete does not match the text).
+    """
+    try:
+        for op in ops:
+            doc = applyOp(doc, op)
+    except ValueError:
+        return None
+    return doc
+
+
+def check(name, condition, **case):
+    if not condition:
+        print("%s failed for:" % name)
+        for key, value in case.items():
+            print("  %s = %r" % (key, value))
+        sys.exit(1)
+
+
+def main(cases, seed):
+    random.seed(seed)
+    for _ in range(cases):
+        doc = "".join(random.choice("abc\n") for _ in range(random.randint(0, 12)))
+
+        # compose
+        op = randomOp(doc)
+        composed = composeOps(op)
+        check("composeOps", apply(doc, composed) == apply(doc, op) and len(composed) <= len(op), doc=doc, op=op, composed=composed)
+
+        # transform
+        left, right = randomOp(doc), randomOp(doc)
+        new_left, new_right = transformOps(left, right)
+        check("transformOps",
+            apply(doc, left, new_right) == apply(doc, right, new_left) is not None,
+            doc=doc, left=left, right=right, new_left=new_left, new_right=new_right)
+    print("%i cases passed (seed %i)" % (cases, seed))
+
+
+if __name__ == "__main__":
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    main(cases, seed)
@@ -0,0 +1,298 @@
+"""
+Minimal local stand-in for an overleaf server, as far as AirLatex talks to it:
+- /login (csrf token & login form), /project (ol-projects, ol-user_id meta tags)
+- /socket.io/1/ handshake and the socket.io v0.9 websocket frames
+- joinProject, joinDoc, applyOtUpdate, otUpdateApplied, clientTracking.*
+  (like overleaf's real-time server, updates are acknowledged once queued and applied
+  on a later loop turn; updates to documents the client has not joined are rejected)
+
+    python bench/fake_overleaf.py [port]
+
+starts the server standalone (login: user@example.com / password).
+"""
+import os
+import sys
+import json
+import html
+import uuid
+import asyncio
+from tornado.web import Application, RequestHandler
+from tornado.websocket import WebSocketHandler
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rplugin", "python3"))
+from airlatex.ot import transformOps
+
+
+EMAIL = "user@example.com"
+PASSWORD = "password"
+COOKIE = "overleaf_session2"
+
+
+def applyOp(text, op):
+    for c in op:
+        if "i" in c:
+            text = text[:c["p"]] + c["i"] + text[c["p"]:]
+        elif "d" in c:
+            if text[c["p"]:c["p"]+len(c["d"])] != c["d"]:
+                raise ValueError("Delete component '%s' does not match document at %i" % (c["d"], c["p"]))
+            text = text[:c["p"]] + text[c["p"]+len(c["d"]):]
+    return text
+
+
+class Document:
+    def __init__(self, name, text):
+        self.id = uuid.uuid4().hex[:24]
+        self.name = name
+        self.text = text
+        self.version = 0
+        self.updates = []
+
+    def apply(self, update, source):
+        """
+        Transforms the update against all updates the client did not know about & applies it.
+        Returns the applied update (only version & "dup" if it is a duplicate).
+        """
+        concurrent = self.updates[update["v"]:]
+        for u in concurrent:
+            if u["meta"]["source"] in update.get("dupIfSource", []):
+                return {"doc": self.id, "v": u["v"], "dup": True}
+        op = update["op"]
+        for u in concurrent:
+            _, op = transformOps(u["op"], op)
+        self.text = applyOp(self.text, op)
+        applied = {"doc": self.id, "op": op, "v": self.version, "meta": {"source": source}}
+        self.updates.append(applied)
+        self.version += 1
+        return applied
+
+
+class FakeOverleaf:
+
+    def __init__(self, documents={"main.tex": "\\documentclass{article}\n"}):
+        self.user_id = uuid.uuid4().hex[:24]
+        self.session = uuid.uuid4().hex
+        self.project_id = uuid.uuid4().hex[:24]
+        self.documents = {}
+        for name, text in documents.items():
+            doc = Document(name, text)
+            self.documents[doc.id] = doc
+        self.clients = {}
+        self.stats = {"frames_in": 0, "frames_out": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def application(self):
+        return Application([
+            (r"/login", LoginHandler, {"server": self}),
+            (r"/project", ProjectHandler, {"server": self}),
+            (r"/socket.io/1/", HandshakeHandler, {"server": self}),
+            (r"/socket.io/1/websocket/([^/]+)", SocketHandler, {"server": self}),
+        ])
+
+    def listen(self, port=0, address="127.0.0.1"):
+        """
+        Starts listening, returns the port.
+        """
+        server = self.application().listen(port, address)
+        return list(server._sockets.values())[0].getsockname()[1]
+
+    def projectInfo(self):
+        return {
+            "_id": self.project_id,
+            "name": "Benchmark Project",
+            "rootDoc_id": next(iter(self.documents)),
+            "rootFolder": [{
+                "_id": uuid.uuid4().hex[:24],
+                "name": "rootFolder",
+                "folders": [],
+                "docs": [{"_id": d.id, "name": d.name} for d in self.documents.values()],
+                "fileRefs": []
+            }],
+            "owner": {"_id": self.user_id, "first_name": "Bench", "last_name": "Mark", "email": EMAIL},
+            "members": [],
+        }
+
+    def projectList(self):
+        return [{
+            "id": self.project_id,
+            "name": "Benchmark Project",
+            "lastUpdated": "2020-01-01T00:00:00.000Z",
+            "lastUpdatedBy": None,
+            "owner": {"first_name": "Bench", "last_name": "Mark"},
+            "accessLevel": "owner",
+            "archived": False,
+            "trashed": False,
+        }]
+
+    # ---------------------- #
+    # simulated collaborators #
+    # ---------------------- #
+
+    def remoteUpdate(self, doc_id, op, source="remote"):
+        """
+        Applies an op of another (simulated) client & broadcasts it.
+        """
+        doc = self.documents[doc_id]
+        applied = doc.apply({"op": op, "v": doc.version}, source)
+        self.broadcast(doc_id, applied, None)
+        return applied
+
+    def broadcast(self, doc_id, update, sender):
+        for client in list(self.clients.values()):
+            if doc_id not in client.joined:
+                continue
+            # op-less acknowledgement for the source (duplicates are not sent to the others)
+            if client is sender:
+                ack = {"v": update["v"], "doc": doc_id}
+                if update.get("dup"):
+                    ack["dup"] = True
+                client.emit("otUpdateApplied", ack)
+            elif not update.get("dup"):
+                client.emit("otUpdateApplied", update)
+
+    def dropConnections(self):
+        for client in list(self.clients.values()):
+            client.close()
+
+
+class BaseHandler(RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    def authenticated(self):
+        return self.get_cookie(COOKIE) == self.server.session
+
+
+class LoginHandler(BaseHandler):
+    def get(self):
+        self.write('<html><form><input name="_csrf" type="hidden" value="csrf-token"></form></html>')
+
+    def post(self):
+        if self.get_body_argument("email", None) != EMAIL or self.get_body_argument("password", None) != PASSWORD or self.get_body_argument("_csrf", None) != "csrf-token":
+            self.set_status(401)
+            self.write("wrong credentials")
+            return
+        self.set_cookie(COOKIE, self.server.session)
+        self.redirect("/project")
+
+
+class ProjectHandler(BaseHandler):
+    def get(self):
+        if not self.authenticated():
+            self.redirect("/login")
+            return
+        projects = html.escape(json.dumps(self.server.projectList()))
+        self.write('<html><head>\n'
+                   '<meta name="ol-user_id" content="%s">\n'
+                   '<meta name="ol-projects" data-type="json" content="%s">\n'
+                   '</head><body></body></html>' % (self.server.user_id, projects))
+
+
+class HandshakeHandler(BaseHandler):
+    def get(self):
+        if not self.authenticated():
+            self.set_status(403)
+            return
+        self.write("%s:60:60:websocket" % uuid.uuid4().hex)
+
+
+class SocketHandler(WebSocketHandler):
+
+    def initialize(self, server):
+        self.server = server
+        self.joined = set()
+        self.public_id = None
+
+    def check_origin(self, origin):
+        return True
+
+    def open(self, sid):
+        if self.get_cookie(COOKIE) != self.server.session:
+            self.send("7:::")
+            self.close()
+            return
+        self.public_id = "P." + sid
+        self.server.clients[self.public_id] = self
+        self.send("1::")
+        self.emit("connectionAccepted", None, self.public_id)
+
+    def on_close(self):
+        self.server.clients.pop(self.public_id, None)
+        for client in self.server.clients.values():
+            client.emit("clientTracking.clientDisconnected", self.public_id)
+
+    def send(self, frame):
+        self.server.stats["frames_out"] += 1
+        self.server.stats["bytes_out"] += len(frame)
+        try:
+            self.write_message(frame)
+        except Exception:
+            pass
+
+    def emit(self, name, *args):
+        self.send("5:::" + json.dumps({"name": name, "args": list(args)}))
+
+    def ack(self, msg_id, *args):
+        self.send("6:::%s+%s" % (msg_id, json.dumps(list(args))))
+
+    def on_message(self, frame):
+        self.server.stats["frames_in"] += 1
+        self.server.stats["bytes_in"] += len(frame)
+        code, msg_id, _, data = frame.split(":", 3) if frame.count(":") >= 3 else (frame[0], "", "", "")
+        if code == "2":
+            return
+        if code != "5":
+            return
+        msg_id = msg_id.rstrip("+")
+        message = json.loads(data)
+        handler = getattr(self, "on_" + message["name"].replace(".", "_"), None)
+        if handler is None:
+            self.ack(msg_id, "unknown message %s" % message["name"])
+            return
+        handler(msg_id, *message.get("args", []))
+
+    def on_joinProject(self, msg_id, options):
+        self.ack(msg_id, None, self.server.projectInfo(), "owner", 2)
+
+    def on_joinDoc(self, msg_id, doc_id, *args):
+        doc = self.server.documents[doc_id]
+        self.joined.add(doc_id)
+        from_version = args[0] if len(args) == 2 else -1
+        lines = [l.encode("utf8").decode("latin1") for l in doc.text.split("\n")]
+        ops = doc.updates[from_version:] if from_version >= 0 else []
+        self.ack(msg_id, None, lines, doc.version, ops, {})
+
+    def on_applyOtUpdate(self, msg_id, doc_id, update):
+        if doc_id not in self.joined:
+            self.ack(msg_id, "not authorized")
+            return
+
+        # acknowledged when queued, applied by the document-updater later
+        self.ack(msg_id)
+        asyncio.get_event_loop().call_soon(self.applyUpdate, doc_id, update)
+
+    def applyUpdate(self, doc_id, update):
+        try:
+            applied = self.server.documents[doc_id].apply(update, self.public_id)
+        except ValueError as e:
+            self.emit("otUpdateError", str(e))
+            return
+        self.server.broadcast(doc_id, applied, self)
+
+    def on_clientTracking_getConnectedUsers(self, msg_id):
+        users = [{"client_id": c.public_id, "user_id": self.server.user_id, "first_name": "Bench", "last_name": "Mark"} for c in self.server.clients.values()]
+        self.ack(msg_id, None, users)
+
+    def on_clientTracking_updatePosition(self, msg_id, position):
+        for client in self.server.clients.values():
+            if client is not self:
+                client.emit("clientTracking.clientUpdated", dict(position, id=self.public_id, user_id=self.server.user_id, name="Bench Mark"))
+        if msg_id:
+            self.ack(msg_id)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+
+    async def main():
+        server = FakeOverleaf()
+        print("Fake overleaf listening on http://127.0.0.1:%i (login: %s / %s)" % (server.listen(port), EMAIL, PASSWORD))
+        await asyncio.Event().wait()
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+In-process stand-ins for the neovim objects used by AirLatex (buffers, windows, sidebar),
+s.t. the plugin code can be benchmarked without running an editor.
+Every call that would be an RPC to neovim is counted in `HeadlessNvim.rpc_calls`.
+"""
+import asyncio
+from collections import Counter
+from pynvim.api import NvimError
+
+
+class HeadlessApi:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def set_lines(self, start, end, strict, lines):
+        self.buffer.nvim.rpc_calls["nvim_buf_set_lines"] += 1
+
+        # negative indices count from the end (-1 is past the last line)
+        if start < 0:
+            start += len(self.buffer) + 1
+        if end < 0:
+            end += len(self.buffer) + 1
+        self.buffer._replace(start, end, lines)
+
+
+class HeadlessBuffer(list):
+    """
+    A list of lines that records changed line ranges like nvim_buf_attach's on_lines.
+    """
+    numbers = iter(range(1, 1 << 30))
+
+    def __init__(self, nvim):
+        super().__init__([""])
+        self.nvim = nvim
+        self.number = next(HeadlessBuffer.numbers)
+        self.api = HeadlessApi(self)
+        self.options = {"modifiable": True}
+        self.changes = None
+
+    __hash__ = object.__hash__
+
+    def __eq__(self, other):
+        return self is other
+
+    def _replace(self, start, end, lines):
+        if not self.options["modifiable"]:
+            raise NvimError("Buffer is not 'modifiable'")
+        super().__setitem__(slice(start, end), lines)
+        if self.changes is not None:
+            self.changes.append([start, end, start + len(lines)])
+
+    def __getitem__(self, key):
+        self.nvim.rpc_calls["nvim_buf_get_lines"] += 1
+        result = super().__getitem__(key)
+        return list(result) if isinstance(key, slice) else result
+
+    def __setitem__(self, key, value):
+        self.nvim.rpc_calls["nvim_buf_set_lines"] += 1
+        if isinstance(key, slice):
+            start, end, _ = key.indices(len(self))
+            self._replace(start, end, list(value))
+        else:
+            self._replace(key, key+1, [value])
+
+    def __delitem__(self, key):
+        self.__setitem__(key if isinstance(key, slice) else slice(key, key+1), [])
+
+    def append(self, line):
+        self.nvim.rpc_calls["nvim_buf_set_lines"] += 1
+        self._replace(len(self), len(self), [line])
+
+    # typing helpers (changes made by the "user")
+    def type(self, row, col, text):
+        line = list.__getitem__(self, row)
+        self._replace(row, row+1, [line[:col] + text + line[col:]])
+
+
+class HeadlessWindow:
+    def __init__(self):
+        self.cursor = (1, 0)
+        self.buffer = None
+
+
+class HeadlessCurrent:
+    def __init__(self):
+        self.window = HeadlessWindow()
+        self.buffer = None
+
+
+class HeadlessNvimApi:
+    """
+    Namespaces & extmarks (stored per buffer number in `HeadlessNvim.extmarks`).
+    """
+    def __init__(self, nvim):
+        self.nvim = nvim
+        self.namespaces = {}
+
+    def create_namespace(self, name):
+        self.nvim.rpc_calls["nvim_create_namespace"] += 1
+        return self.namespaces.setdefault(name, len(self.namespaces) + 1)
+
+    def call_atomic(self, calls):
+        self.nvim.rpc_calls["nvim_call_atomic"] += 1
+        results = []
+        for method, args in calls:
+            marks = self.nvim.extmarks.setdefault(args[0], {})
+            if method == "nvim_buf_set_extmark":
+                marks[args[4]["id"]] = (args[2], args[3], args[4])
+                results.append(args[4]["id"])
+            elif method == "nvim_buf_del_extmark":
+                results.append(marks.pop(args[2], None) is not None)
+            else:
+                return [results, [len(results), 0, "unknown method " + method]]
+        return [results, None]
+
+
+class HeadlessNvim:
+    """
+    Supports nvim.command/eval/exec_lua/async_call/loop/api & nvim.current as far as DocumentBuffer needs them.
+    """
+    def __init__(self, settings={}):
+        self.loop = asyncio.get_event_loop()
+        self.current = HeadlessCurrent()
+        self.rpc_calls = Counter()
+        self.api = HeadlessNvimApi(self)
+        self.extmarks = {}
+        self.settings = {
+            "g:AirLatexTrackChanges": 1,
+            "g:AirLatexWriteDelay": 0,
+            "g:AirLatexProgressiveLoad": 0,
+            "g:AirLatexCursorFPS": 10,
+        }
+        self.settings.update(settings)
+
+    def command(self, cmd):
+        self.rpc_calls["nvim_command"] += 1
+        if cmd == "enew":
+            self.current.buffer = HeadlessBuffer(self)
+            self.current.window.buffer = self.current.buffer
+
+    def eval(self, expr):
+        self.rpc_calls["nvim_eval"] += 1
+        return self.settings[expr]
+
+    def exec_lua(self, code, *args):
+        self.rpc_calls["nvim_exec_lua"] += 1
+        buffer = self.current.buffer
+        if "nvim_buf_attach" in code:
+            buffer.changes = []
+            return True
+        if "nvim_buf_line_count" in code:
+            changes, buffer.changes = buffer.changes, []
+            return [changes, len(buffer)]
+        raise NotImplementedError(code)
+
+    def async_call(self, fn, *args, **kwargs):
+        self.loop.call_soon(lambda: fn(*args, **kwargs))
+
+
+class HeadlessSidebar:
+    async def triggerRefresh(self, all=True):
+        pass
+
+    async def updateStatus(self, msg):
+        pass
+
+    def cacheProjectList(self, projectList, user_id=None):
+        pass
@@ -40,6 +40,10 @@ if !exists("g:AirLatexLogFile")
 endif
 autocmd BufNewFile,BufRead AirLatex.log set filetype=airlatex_log
 
+if !exists("g:AirLatexLogQueue")
+    let g:AirLatexLogQueue=0
+endif
+
 if !exists("g:AirLatexUseHTTPS")
     let g:AirLatexUseHTTPS=1
 endif
@@ -52,6 +56,34 @@ if !exists("g:AirLatexWebsocketTimeout")
     let g:AirLatexWebsocketTimeout=10
 endif
 
+if !exists("g:AirLatexTrackChanges")
+    let g:AirLatexTrackChanges=1
+endif
+
+if !exists("g:AirLatexWriteDelay")
+    let g:AirLatexWriteDelay=100
+endif
+
+if !exists("g:AirLatexProgressiveLoad")
+    let g:AirLatexProgressiveLoad=0
+endif
+
+if !exists("g:AirLatexProjectCache")
+    let g:AirLatexProjectCache=1
+endif
+
+if !exists("g:AirLatexCursorFPS")
+    let g:AirLatexCursorFPS=10
+endif
+
+" cursors of collaborators (defined anew when the colorscheme changes)
+function! s:cursorHighlights()
+    hi def link AirLatexCursor IncSearch
+    hi def link AirLatexCursorName Comment
+endfunction
+call s:cursorHighlights()
+autocmd ColorScheme * call s:cursorHighlights()
+
 
 
 " vim: set sw=4 sts=4 et fdm=marker:
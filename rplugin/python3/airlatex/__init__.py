@@ -8,6 +8,7 @@ from airlatex.sidebar import SideBar
 from airlatex.session import AirLatexSession
 from airlatex.documentbuffer import DocumentBuffer
 from airlatex.util import logging_settings, init_logger, __version__
+from airlatex.stats import stats
 
 
 
@@ -27,16 +28,20 @@ class AirLatex:
         # update user settings for logging
         logging_settings["level"]=self.nvim.eval("g:AirLatexLogLevel")
         logging_settings["file"]=self.nvim.eval("g:AirLatexLogFile")
+        logging_settings["queue"]=self.nvim.eval("g:AirLatexLogQueue")
         log = init_logger()
-        log.info("Starting AirLatex (Version %s)" % __version__)
+        log.info("Starting AirLatex (Version %s)", __version__)
         log.info("System Info:")
-        log.info("  - Python Version: %i.%i" % (version_info.major, version_info.minor))
-        log.info("  - OS: %s (%s)" % (platform.system(), platform.release()))
+        log.info("  - Python Version: %i.%i", version_info.major, version_info.minor)
+        log.info("  - OS: %s (%s)", platform.system(), platform.release())
         self.log = log
 
         # initialize exception handling for asyncio
         self.nvim.loop.set_exception_handler(self.asyncCatchException)
 
+        # count rpc calls for :AirLatexStats
+        stats.countRequests(self.nvim)
+
         # initialize sidebar
         if not self.sidebar:
             self.sidebar = SideBar(self.nvim, self)
@@ -83,11 +88,31 @@ class AirLatex:
         self.nvim.command("call inputrestore()")
         keyring.set_password("airlatex_"+DOMAIN, username, self.nvim.eval("user_input"))
 
+    @pynvim.command('AirLatexStats', nargs='?', complete='file', sync=True)
+    def showStats(self, args):
+
+        # export as json
+        if args:
+            stats.export(args[0])
+            self.nvim.out_write("AirLatex statistics written to %s\n" % args[0])
+            return
+
+        # show summary in a scratch buffer
+        self.nvim.command("new")
+        self.nvim.command("setlocal buftype=nofile bufhidden=wipe noswapfile nobuflisted")
+        self.nvim.current.buffer[:] = stats.format()
+        self.nvim.command("setlocal nomodifiable")
+
     @pynvim.function('AirLatex_SidebarRefresh', sync=False)
     def sidebarRefresh(self, args):
         if self.sidebar:
             create_task(self.sidebar.triggerRefresh())
 
+    @pynvim.function('AirLatex_SidebarCursor', sync=False)
+    def sidebarCursor(self, args):
+        if self.sidebar:
+            create_task(self.sidebar.triggerCursorMove())
+
     @pynvim.function('AirLatex_SidebarUpdateStatus', sync=False)
     def sidebarStatus(self, args):
         create_task(self.sidebar.updateStatus())
@@ -116,7 +141,7 @@ class AirLatex:
     def writeBuffer(self, args):
         buffer = self.nvim.current.buffer
         if buffer in DocumentBuffer.allBuffers:
-            DocumentBuffer.allBuffers[buffer].writeBuffer()
+            DocumentBuffer.allBuffers[buffer].writeBuffer(force=len(args) > 0 and bool(args[0]))
 
     def asyncCatchException(self, loop, context):
         message = context.get('message')
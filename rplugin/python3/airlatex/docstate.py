@@ -0,0 +1,208 @@
+from bisect import bisect_right
+from itertools import accumulate
+from hashlib import sha1
+from time import monotonic
+
+
+class DocumentState:
+
+    block_size = 128
+    interval = 5
+
+    def __init__(self, lines=()):
+        """
+        Content of a document as known by the server (the buffer is diffed against it).
+        - lines are stored in blocks of ~block_size lines, with the character count of every block
+        - server ops & local changes only touch the blocks concerned
+        - offset <-> (row, col) is found by bisecting the cummulative block sums
+        - the utf8-encoding of every block is cached for the git-blob sha1 sent with the updates
+          (overleaf only needs the hash once every `interval` seconds)
+        """
+        self.last_sent = None
+        self.reset(lines)
+
+    def reset(self, lines):
+        if not isinstance(lines, list):
+            lines = list(lines)
+        B = self.block_size
+        self.blocks = [lines[i:i+B] for i in range(0, len(lines), B)] or [[]]
+        self.sums = [sum(map(len, b)) + len(b) for b in self.blocks]
+        self.encoded = [None] * len(self.blocks)
+        self.digest = None
+        self._dirty = True
+
+    def __len__(self):
+        self._update()
+        return self.block_rows[-1]
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def __getitem__(self, key):
+        """
+        A line (by row) or a list of lines (by slice).
+        """
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+            bi = self._block(key)
+            return self.blocks[bi][key-self.block_rows[bi]]
+        start, end, _ = key.indices(len(self))
+        if start >= end:
+            return []
+        bi = self._block(start)
+        lines = self.blocks[bi][start-self.block_rows[bi]:end-self.block_rows[bi]]
+        while len(lines) < end - start:
+            bi += 1
+            lines.extend(self.blocks[bi][:end-start-len(lines)])
+        return lines
+
+    # ------- #
+    # helpers #
+    # ------- #
+
+    def _update(self):
+        """
+        Recomputes the cummulative rows/offsets of the blocks (O(number of blocks)).
+        """
+        if self._dirty:
+            self.block_rows = [0] + list(accumulate(len(b) for b in self.blocks))
+            self.block_offsets = [0] + list(accumulate(self.sums))
+            self._dirty = False
+
+    def _block(self, row):
+        """
+        Index of the block containing the given row.
+        """
+        self._update()
+        return min(bisect_right(self.block_rows, row), len(self.blocks)) - 1
+
+    # --- #
+    # api #
+    # --- #
+
+    def length(self):
+        """
+        Number of characters of the whole document.
+        """
+        self._update()
+        return max(self.block_offsets[-1] - 1, 0)
+
+    def offset(self, row):
+        """
+        Character offset of the start of the given row.
+        """
+        bi = self._block(row)
+        block = self.blocks[bi][:row-self.block_rows[bi]]
+        return self.block_offsets[bi] + sum(map(len, block)) + len(block)
+
+    def locate(self, offset):
+        """
+        Converts a character offset into (row, col).
+        Offsets behind the document end are located in the last line.
+        """
+        self._update()
+        bi = min(bisect_right(self.block_offsets, offset), len(self.blocks)) - 1
+
+        # skip empty blocks
+        while bi > 0 and not self.blocks[bi]:
+            bi -= 1
+
+        row = self.block_rows[bi]
+        linestart = self.block_offsets[bi]
+        for line in self.blocks[bi][:-1]:
+            length = len(line) + 1
+            if offset < linestart + length:
+                break
+            linestart += length
+            row += 1
+        return row, offset - linestart
+
+    def replace(self, start, end, lines):
+        """
+        Replaces the rows start:end by the given lines.
+        """
+        bi_start = self._block(start)
+        bi_end = self._block(max(end-1, start))
+
+        # change within one block (the usual case when typing)
+        first_row = self.block_rows[bi_start]
+        block = self.blocks[bi_start]
+        if bi_start == bi_end and 0 < len(block) - (end - start) + len(lines) <= 2*self.block_size:
+            old = block[start-first_row:end-first_row]
+            block[start-first_row:end-first_row] = lines
+            self.sums[bi_start] += sum(map(len, lines)) + len(lines) - sum(map(len, old)) - len(old)
+            self.encoded[bi_start] = None
+            self.digest = None
+            self._dirty = True
+            return
+
+        # splice the affected blocks
+        merged = [l for b in self.blocks[bi_start:bi_end+1] for l in b]
+        merged[start-first_row:end-first_row] = lines
+
+        # rechunk if blocks got too large or empty
+        B = self.block_size
+        new_blocks = [merged[i:i+B] for i in range(0, len(merged), B)]
+        if not new_blocks and len(self.blocks) == bi_end - bi_start + 1:
+            new_blocks = [[]]
+
+        self.blocks[bi_start:bi_end+1] = new_blocks
+        self.sums[bi_start:bi_end+1] = [sum(map(len, b)) + len(b) for b in new_blocks]
+        self.encoded[bi_start:bi_end+1] = [None] * len(new_blocks)
+        self.digest = None
+        self._dirty = True
+
+    def insert(self, offset, string):
+        """
+        Inserts a string at the given character offset.
+        Returns the rows changed: (row, end of the rows before, end of the rows after).
+        """
+        row, col = self.locate(offset)
+        line = self[row]
+        new_lines = (line[:col] + string + line[col:]).split("\n")
+        self.replace(row, row+1, new_lines)
+        return row, row+1, row+len(new_lines)
+
+    def remove(self, offset, string):
+        """
+        Removes the given string found at the character offset.
+        Returns the rows changed: (row, end of the rows before, end of the rows after).
+        """
+        row, col = self.locate(offset)
+        num_lines = string.count("\n") + 1
+        last = string[string.rfind("\n")+1:]
+
+        # rest of the last line is appended to the first
+        if num_lines == 1:
+            line = self[row]
+            new_line = line[:col] + line[col+len(last):]
+        else:
+            new_line = self[row][:col] + self[row+num_lines-1][len(last):]
+        self.replace(row, row+num_lines, [new_line])
+        return row, row+num_lines, row+1
+
+    def hexdigest(self):
+        """
+        Git-blob sha1 of the document (only changed blocks are encoded anew).
+        """
+        if self.digest is None:
+            for bi, block in enumerate(self.blocks):
+                if self.encoded[bi] is None:
+                    self.encoded[bi] = "\n".join(block).encode()
+            sha = sha1()
+            sha.update(("blob %i\x00" % self.length()).encode())
+            sha.update(b"\n".join(e for e, b in zip(self.encoded, self.blocks) if b))
+            self.digest = sha.hexdigest()
+        return self.digest
+
+    def hexdigestIfDue(self):
+        """
+        Returns the hash if it has not been sent during the last `interval` seconds, None otherwise.
+        """
+        now = monotonic()
+        if self.last_sent is not None and now - self.last_sent < self.interval:
+            return None
+        self.last_sent = now
+        return self.hexdigest()
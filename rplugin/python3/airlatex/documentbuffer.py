@@ -1,15 +1,55 @@
 import pynvim
 from difflib import SequenceMatcher
 from threading import RLock
-from hashlib import sha1
+from itertools import count
 from asyncio import create_task
+from time import monotonic
 from logging import getLogger
+from pynvim.api import NvimError
+from airlatex.docstate import DocumentState
+from airlatex.stats import stats
+
+# records the changed line ranges of a buffer using nvim_buf_attach
+# (each entry is {firstline, lastline, new_lastline} as in on_lines)
+_track_changes_lua = """
+local buf = ...
+AirLatexChanges = AirLatexChanges or {}
+AirLatexChanges[buf] = {}
+return vim.api.nvim_buf_attach(buf, false, {
+    on_lines = function(_, b, _, first, last_old, last_new)
+        local changes = AirLatexChanges[b]
+        if changes == nil then
+            return true
+        end
+        changes[#changes+1] = {first, last_old, last_new}
+    end,
+    on_detach = function(_, b)
+        AirLatexChanges[b] = nil
+    end
+})
+"""
+
+# returns & clears the recorded changes together with the current line count
+_pop_changes_lua = """
+local buf = ...
+local changes = AirLatexChanges and AirLatexChanges[buf]
+if changes == nil then
+    return vim.NIL
+end
+AirLatexChanges[buf] = {}
+return {changes, vim.api.nvim_buf_line_count(buf)}
+"""
 
 if "allBuffers" not in globals():
     allBuffers = {}
 class DocumentBuffer:
     allBuffers = allBuffers
 
+    # lines written per call after the first screenful (progressive loading)
+    # & seconds between the calls (neovim redraws & handles input in between)
+    stream_chunk = 5000
+    stream_pause = 0.01
+
     def __init__(self, path, nvim):
         self.log = getLogger("AirLatex")
         self.path = path
@@ -19,6 +59,13 @@ class DocumentBuffer:
         self.initDocumentBuffer()
         self.buffer_mutex = RLock()
         self.saved_buffer = None
+        self.write_delay = self.nvim.eval("g:AirLatexWriteDelay") / 1000
+        self.write_handle = None
+        self.progressive_load = self.nvim.eval("g:AirLatexProgressiveLoad")
+        self.loading = 0
+        self.deferred = []
+        self.initChangeTracking()
+        self.initRemoteCursors()
 
     def getName(self):
         return "/".join([p["name"] for p in self.path])
@@ -50,64 +97,275 @@ class DocumentBuffer:
         # self.nvim.command("autocmd CursorHold,CursorHoldI * :call AirLatex_update_pos()")
         self.nvim.command("au CursorMoved <buffer> call AirLatex_WriteBuffer()")
         self.nvim.command("au CursorMovedI <buffer> call AirLatex_WriteBuffer()")
-        self.nvim.command("command! -buffer -nargs=0 W call AirLatex_WriteBuffer()")
+        self.nvim.command("command! -buffer -nargs=0 W call AirLatex_WriteBuffer(1)")
+
+    def initChangeTracking(self):
+        self.track_changes = False
+        if not self.nvim.eval("g:AirLatexTrackChanges"):
+            return
+
+        # let neovim record which lines changed, s.t. only those need to be diffed
+        try:
+            self.track_changes = self.nvim.exec_lua(_track_changes_lua, self.buffer.number)
+        except NvimError as e:
+            self.log.debug("initChangeTracking: not available (%s), using full diffs", e)
+        self.log.debug_gui("initChangeTracking: %s", self.track_changes)
+
+    def initRemoteCursors(self):
+
+        # cursors of collaborators are extmarks (they move with the text on their own)
+        # updates are collected per client & drawn at most once per frame
+        fps = self.nvim.eval("g:AirLatexCursorFPS")
+        self.cursor_namespace = self.nvim.api.create_namespace("AirLatexCursors") if fps else None
+        self.cursor_interval = 1 / fps if fps else 0
+        self.cursor_updates = {}
+        self.cursor_marks = {}
+        self.cursor_ids = count(1)
+        self.cursor_handle = None
+        self.last_cursor_render = 0
+
+    def popChangedRegion(self):
+        """
+        Returns the range of lines (start, end, num_lines) of the current buffer
+        that contains all changes since the last call, or None if nothing changed.
+        """
+        result = self.nvim.exec_lua(_pop_changes_lua, self.buffer.number)
+
+        # buffer got detached => fall back to full diffs
+        if result is None:
+            self.log.debug("popChangedRegion: buffer detached, using full diffs")
+            self.track_changes = False
+            return 0, len(self.buffer), len(self.buffer)
+
+        changes, num_lines = result
+        if not changes:
+            return None
+
+        # merge all changes into one region (in coordinates of the current buffer)
+        start, _, end = changes[0]
+        for first, last_old, last_new in changes[1:]:
+            end = max(end, last_old) + last_new - last_old
+            start = min(start, first)
+        return start, min(end, num_lines), num_lines
 
     def write(self, lines):
         self.log.debug("writing to buffer")
 
-        def writeLines(buffer,lines):
-            buffer[0] = lines[0]
-            for l in lines[1:]:
-                buffer.append(l)
-            self.saved_buffer = buffer[:]
-        self.nvim.async_call(writeLines,self.buffer,lines)
+        # whole document at once, or the first screenful followed by large chunks
+        # (server updates received meanwhile are applied after the last one, see callLoaded)
+        first = self.progressive_load if 0 < self.progressive_load < len(lines) else len(lines)
+        chunks = [(0, lines[:first])] + [(i, lines[i:i+self.stream_chunk]) for i in range(first, len(lines), self.stream_chunk)]
+        self.loading = len(chunks)
+
+        def writeLines(start, chunk):
+            if start == 0:
+                self.buffer.api.set_lines(0, -1, False, chunk)
+            else:
+                self.buffer.options["modifiable"] = True
+                self.buffer.api.set_lines(start, start, False, chunk)
+            self.loading -= 1
+
+            # the user cannot edit the buffer until all lines are known
+            if self.loading:
+                self.buffer.options["modifiable"] = False
+                self.nvim.loop.call_later(self.stream_pause, self.nvim.async_call, writeLines, *chunks[-self.loading])
+                return
+            self.saved_buffer = DocumentState(lines)
+
+            # initial content is not a change to be sent
+            if self.track_changes:
+                self.popChangedRegion()
+
+            # cursors & updates received while loading
+            if self.cursor_updates:
+                self.scheduleCursors()
+            deferred, self.deferred = self.deferred, []
+            for call in deferred:
+                call()
+        self.nvim.async_call(writeLines, *chunks[0])
+
+    def callLoaded(self, fn, *args):
+        """
+        Calls fn in neovim's context once the document has been loaded completely
+        (keeps the order of updates, acknowledgements & resumes).
+        """
+        def call():
+            if self.loading:
+                self.deferred.append(call)
+            else:
+                fn(*args)
+        self.nvim.async_call(call)
 
     def updateRemoteCursor(self, cursor):
-        self.log.debug("updateRemoteCursor")
-        # def updateRemoteCursor(cursor, nvim):
-        #     nvim.command("match ErrorMsg #\%"+str(cursor["row"])+"\%"+str(cursor["column"])+"v#")
-        # self.nvim.async_call(updateRemoteCursor, cursor, self.nvim)
+        self.log.debug_gui("updateRemoteCursor(%s)", cursor["id"])
+        stats.count("cursors.received")
+        self.cursor_updates[cursor["id"]] = cursor
+        self.scheduleCursors()
+
+    def removeRemoteCursor(self, client_id):
+        self.log.debug_gui("removeRemoteCursor(%s)", client_id)
+        self.cursor_updates[client_id] = None
+        self.scheduleCursors()
+
+    def scheduleCursors(self):
+        """
+        Draws the collected cursor updates with the next frame (only the latest position per client).
+        """
+        if self.cursor_namespace is None or self.cursor_handle is not None:
+            return
+        delay = max(0, self.last_cursor_render + self.cursor_interval - monotonic())
+        self.cursor_handle = self.nvim.loop.call_later(delay, self.nvim.async_call, self.renderCursors)
+
+    def renderCursors(self):
+        self.cursor_handle = None
+
+        # positions refer to the document content (drawn once it is loaded)
+        if self.saved_buffer is None or self.loading:
+            return
+        self.last_cursor_render = monotonic()
+        updates, self.cursor_updates = self.cursor_updates, {}
+
+        calls = []
+        num_lines = len(self.saved_buffer)
+        for client_id, cursor in updates.items():
+
+            # client left the document
+            if cursor is None:
+                if client_id in self.cursor_marks:
+                    calls.append(["nvim_buf_del_extmark", [self.buffer.number, self.cursor_namespace, self.cursor_marks.pop(client_id)]])
+                continue
+
+            # row & column are given in characters of the server's content
+            row = min(max(cursor["row"], 0), num_lines-1)
+            line = self.saved_buffer[row]
+            column = min(max(cursor["column"], 0), len(line))
+            col = len(line[:column].encode())
+            end_col = col + len(line[column:column+1].encode())
+
+            if client_id not in self.cursor_marks:
+                self.cursor_marks[client_id] = next(self.cursor_ids)
+            mark = {
+                "id": self.cursor_marks[client_id],
+                "virt_text": [[" " + cursor.get("name", "?"), "AirLatexCursorName"]],
+                "virt_text_pos": "eol",
+            }
+            if end_col > col:
+                mark["end_col"] = end_col
+                mark["hl_group"] = "AirLatexCursor"
+            calls.append(["nvim_buf_set_extmark", [self.buffer.number, self.cursor_namespace, row, col, mark]])
+
+        # one rpc per frame (failed calls are skipped, e.g. if the buffer is shorter than the server's content)
+        while calls:
+            stats.count("cursors.rendered", len(calls))
+            _, error = self.nvim.api.call_atomic(calls)
+            if error is None:
+                break
+            self.log.debug("renderCursors: %s", error)
+            calls = calls[error[0]+1:]
+
+    def writeBuffer(self, force=False):
 
-    def writeBuffer(self):
+        # collect all cursor movements & changes within the write delay
+        if self.write_delay and not force:
+            if self.write_handle is None:
+                self.write_handle = self.nvim.loop.call_later(self.write_delay, self.nvim.async_call, self._writeBuffer)
+            return
+        self._writeBuffer()
+
+    def _writeBuffer(self):
         self.log.debug("writeBuffer: calculating changes to send")
+        if self.write_handle is not None:
+            self.write_handle.cancel()
+            self.write_handle = None
 
         # update CursorPosition
-        create_task(self.project_handler.updateCursor(self.document, self.nvim.current.window.cursor))
+        if self.nvim.current.buffer == self.buffer:
+            create_task(self.project_handler.updateCursor(self.document, self.nvim.current.window.cursor))
+
+        self.syncBuffer()
+
+    def syncBuffer(self):
+        """
+        Sends the changes of the buffer since the last call to the server.
+        """
 
         # skip if not yet initialized
-        if self.saved_buffer is None:
+        if self.saved_buffer is None or self.loading:
             self.log.debug("writeBuffer: -> buffer not yet initialized")
             return
 
-        # nothing to do
-        if len(self.saved_buffer) == len(self.buffer):
-            skip = True
-            for ol,nl in zip(self.saved_buffer, self.buffer):
-                if hash(ol) != hash(nl):
-                    skip = False
-                    break
-            if skip:
-                self.log.debug("writeBuffer: -> done (hashtest says nothing to do)")
+        # only diff the lines that neovim reported as changed
+        if self.track_changes:
+            region = self.popChangedRegion()
+            if region is None:
+                self.log.debug("writeBuffer: -> done (no lines changed)")
                 return
+            start, end, num_lines = region
+            old_end = end - (num_lines - len(self.saved_buffer))
+            new_lines = self.buffer[start:end]
+
+        # diff whole buffer
+        else:
+            new_lines = self.buffer[:]
+
+            # nothing to do
+            if len(self.saved_buffer) == len(new_lines):
+                skip = True
+                for ol,nl in zip(self.saved_buffer, new_lines):
+                    if hash(ol) != hash(nl):
+                        skip = False
+                        break
+                if skip:
+                    self.log.debug("writeBuffer: -> done (hashtest says nothing to do)")
+                    return
+            start, old_end = 0, len(self.saved_buffer)
+
+        diff_start = monotonic()
+        ops = self._diffLines(start, old_end, new_lines)
+        stats.since("buffer.diff", diff_start)
+
+        # nothing to do
+        if len(ops) == 0:
+            self.log.debug("writeBuffer: -> done (sequencematcher says nothing to do)")
+            return
+
+        # reverse, as last op should be applied first
+        ops.reverse()
+
+        # update saved buffer
+        self.saved_buffer.replace(start, old_end, new_lines)
+
+        # hash of current buffer (only if the server expects one)
+        content_hash = self.saved_buffer.hexdigestIfDue()
+
+        # send command
+        self.log.debug(" -> sending ops")
+        self.project_handler.sendOps(self.document, content_hash, ops)
+
+    def _diffLines(self, start, old_end, new_lines):
+        """
+        Computes the ops that turn the lines saved_buffer[start:old_end] into new_lines.
+        """
+        old_lines = self.saved_buffer[start:old_end]
 
-        # cummulative position of line
-        pos = [0]
-        for row in self.saved_buffer:
+        # cummulative position of line (starting at the first line of the region)
+        pos = [self.saved_buffer.offset(start)]
+        for row in old_lines:
             # pos.append(pos[-1]+ ( len(row)+1 if len(row) > 0 else 0 ) )
             pos.append(pos[-1]+len(row)+1)
 
         # first calculate diff row-wise
         ops = []
-        S = SequenceMatcher(None, self.saved_buffer, self.buffer, autojunk=False).get_opcodes()
+        S = SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes()
         for op in S:
             if op[0] == "equal":
                 continue
 
             # inserting a whole row
             elif op[0] == "insert":
-                s = "\n".join(self.buffer[op[3]:op[4]])
-                if op[1] >= len(self.saved_buffer):
-                    p = pos[-1] - 1
+                s = "\n".join(new_lines[op[3]:op[4]])
+                if start + op[1] >= len(self.saved_buffer):
+                    p = pos[op[1]] - 1
                     s = "\n" + s
                 else:
                     p = pos[op[1]]
@@ -116,9 +374,9 @@ class DocumentBuffer:
 
             # deleting a whole row
             elif op[0] == "delete":
-                s = "\n".join(self.saved_buffer[op[1]:op[2]])
-                if op[1] == len(self.buffer):
-                    p = pos[-(op[2]-op[1])-1] - 1
+                s = "\n".join(old_lines[op[1]:op[2]])
+                if start + op[2] >= len(self.saved_buffer) and start + op[1] > 0:
+                    p = pos[op[1]] - 1
                     s = "\n" + s
                 else:
                     p = pos[op[1]]
@@ -127,8 +385,8 @@ class DocumentBuffer:
 
             # for replace, check in more detail what has changed
             elif op[0] == "replace":
-                old = "\n".join(self.saved_buffer[op[1]:op[2]])
-                new = "\n".join(self.buffer[op[3]:op[4]])
+                old = "\n".join(old_lines[op[1]:op[2]])
+                new = "\n".join(new_lines[op[3]:op[4]])
                 S2 = SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
                 for op2 in S2:
                     # relative to document end
@@ -146,126 +404,75 @@ class DocumentBuffer:
 
                     elif op2[0] == "delete":
                         ops.append({"p": linestart + op2[1], "d": old[op2[1]:op2[2]]})
-
-        # nothing to do
-        if len(ops) == 0:
-            self.log.debug("writeBuffer: -> done (sequencematcher says nothing to do)")
-            return
-
-        # reverse, as last op should be applied first
-        ops.reverse()
-
-        # compute sha1-hash of current buffer
-        buffer_cpy = self.buffer[:]
-        current_len = 0
-        for row in buffer_cpy:
-            current_len += len(row)+1
-        current_len -= 1
-        tohash = ("blob "+str(current_len) + "\x00")
-        for b in buffer_cpy[:-1]:
-            tohash += b+"\n"
-        tohash += buffer_cpy[-1]
-        sha = sha1()
-        sha.update(tohash.encode())
-        content_hash = sha.hexdigest()
-
-        # update saved buffer & send command
-        self.saved_buffer = self.buffer[:]
-        self.log.debug(" -> sending ops")
-        create_task(self.project_handler.sendOps(self.document, content_hash, ops))
+        return ops
 
     def applyUpdate(self,ops):
         self.log.debug("apply server updates to buffer")
 
-        # adapt version
-        if "v" in ops:
-            v = ops["v"]
-            if v >= self.document["version"]:
-                self.document["version"] = v+1
-
-        # do nothing if no op included
-        if not 'op' in ops:
-            return
-        self.log.debug("got ops:"+str(ops))
-        ops = ops['op']
-
-        # async execution
-        def applyOps(self, ops):
+        # async execution (versions have to be adapted in order with the acknowledgements)
+        def applyOps(self, update):
             self.buffer_mutex.acquire()
             try:
+
+                # adapt version
+                if "v" in update:
+                    v = update["v"]
+                    if v >= self.document["version"]:
+                        self.document["version"] = v+1
+
+                # no op included => the server applied our inflight ops
+                # (sent to us only, in order with the updates of the others)
+                if not 'op' in update:
+                    if self.document.get("inflight") is not None:
+                        self.project_handler.acknowledgeOps(self.document)
+                    return
+                self.log.debug("got ops: %s", update)
+                ops = update['op']
+                stats.count("ops.received", len(ops))
+                apply_start = monotonic()
+
+                # local changes have to be known before the buffer can be overwritten
+                self.syncBuffer()
+
+                # ops do not know about our unacknowledged changes
+                ops = self.project_handler.transformRemoteOps(self.document, ops)
+
+                # apply ops to saved buffer & remember the changed lines
+                start, end = len(self.saved_buffer), 0
+                num_lines = len(self.saved_buffer)
                 for op in ops:
 
                     # delete char and lines
                     if 'd' in op:
-                        p = op['p']
-                        s = op['d']
-                        self._remove(self.saved_buffer,p,s)
-                        self._remove(self.buffer,p,s)
+                        row, last_old, last_new = self.saved_buffer.remove(op['p'], op['d'])
 
                     # add characters and newlines
-                    if 'i' in op:
-                        p = op['p']
-                        s = op['i']
-                        self._insert(self.saved_buffer,p,s)
-                        self._insert(self.buffer,p,s)
-            finally:
-                self.buffer_mutex.release()
-        self.nvim.async_call(applyOps, self, ops)
+                    elif 'i' in op:
+                        row, last_old, last_new = self.saved_buffer.insert(op['p'], op['i'])
 
-    # inster string at given position
-    def _insert(self, buffer, start, string):
-        p_linestart = 0
-
-        # find start line
-        for line_i, line in enumerate(self.buffer):
-
-            # start is not yet there
-            if start >= p_linestart+len(line)+1:
-                p_linestart += len(line)+1
-            else:
-                break
-
-        # convert format to array-style
-        string = string.split("\n")
-
-        # append end of current line to last line of new line
-        string[-1] += line[(start-p_linestart):]
-
-        # include string at start position
-        buffer[line_i] = line[:(start-p_linestart)] + string[0]
-
-        # append rest to next line
-        if len(string) > 1:
-            buffer[line_i+1:line_i+1] = string[1:]
-
-    # remove len chars from pos
-    def _remove(self, buffer, start, string):
-        p_linestart = 0
-
-        # find start line
-        for line_i, line in enumerate(buffer):
-
-            # start is not yet there
-            if start >= p_linestart+len(line)+1:
-                p_linestart += len(line)+1
-            else:
-                break
-
-        # convert format to array-style
-        string = string.split("\n")
-        new_string = ""
+                    else:
+                        continue
 
-        # remove first line from found position
-        new_string = line[:(start-p_linestart)]
+                    end = max(end, last_old) + last_new - last_old
+                    start = min(start, row)
 
-        # add rest of last line to new string
-        if len(string) == 1:
-            new_string += buffer[line_i+len(string)-1][(start-p_linestart)+len(string[-1]):]
-        else:
-            new_string += buffer[line_i+len(string)-1][len(string[-1]):]
+                # write all changed lines at once
+                if start < end or len(self.saved_buffer) != num_lines:
+                    old_end = end - (len(self.saved_buffer) - num_lines)
+                    self.buffer.api.set_lines(start, old_end, False, self.saved_buffer[start:end])
+                stats.since("buffer.apply", apply_start)
+            finally:
+                self.buffer_mutex.release()
+        self.callLoaded(applyOps, self, ops)
 
-        # overwrite buffer
-        buffer[line_i:line_i+len(string)] = [new_string]
+    def acknowledge(self, version):
+        self.log.debug("server acknowledged our update")
 
+        # keep order with the updates to be applied
+        self.callLoaded(self.project_handler.acknowledgeOps, self.document, version)
 
+    def resume(self):
+        self.log.debug("resume sending after reconnect")
 
+        # keep order with the updates to be applied
+        self.callLoaded(self.project_handler.resumeOps, self.document)
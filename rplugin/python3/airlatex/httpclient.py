@@ -0,0 +1,135 @@
+from time import monotonic
+from http.cookies import SimpleCookie
+from urllib.parse import urljoin, urlencode, urlsplit
+from logging import getLogger
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from airlatex.stats import stats
+
+REDIRECTS = (301, 302, 303, 307, 308)
+
+# curl keeps connections alive between requests (if pycurl is installed)
+try:
+    import pycurl
+    AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient")
+except ImportError:
+    pass
+
+
+class Response:
+
+    def __init__(self, response, url):
+        """
+        The parts of a tornado response the session needs (named as in requests).
+        """
+        self.status_code = response.code
+        self.headers = response.headers
+        self.body = response.body or b""
+        self.url = url
+        self.ok = response.code < 400
+        self.request_time = response.request_time
+
+    @property
+    def text(self):
+        return self.body.decode("utf8", errors="replace")
+
+    def __repr__(self):
+        return "<Response [%i] %s>" % (self.status_code, self.url)
+
+
+class HTTPClient:
+
+    def __init__(self, verify=True, timeout=60, max_redirects=5):
+        """
+        Non-blocking http client of the session (on the tornado/asyncio loop of the plugin).
+        - cookies are kept per session, s.t. they can be passed to the websocket connection
+        - redirects are followed manually to catch the cookies set on the way
+        - the duration of every call is kept per request path
+        """
+        self.client = AsyncHTTPClient()
+        self.verify = verify
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.cookies = {}
+        self.timings = {}
+        self.log = getLogger("AirLatex")
+
+    def cookieHeader(self):
+        return "; ".join(name + "=" + value for name, value in self.cookies.items())
+
+    def _updateCookies(self, headers):
+        for header in headers.get_list("Set-Cookie"):
+            cookie = SimpleCookie()
+            try:
+                cookie.load(header)
+            except Exception:
+                continue
+            for name, morsel in cookie.items():
+                if morsel["max-age"] == "0":
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    def _time(self, key, start):
+        duration = monotonic() - start
+        timing = self.timings.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += duration
+        timing["max"] = max(timing["max"], duration)
+        stats.record("http." + key, duration)
+        self.log.debug("%s took %.1f ms", key, duration*1000)
+
+    async def request(self, method, url, data=None, allow_redirects=True, headers=None, streaming_callback=None):
+        start = monotonic()
+        key = method + " " + urlsplit(url).path
+        body = urlencode(data) if data is not None else None
+
+        # bodies of redirects are not streamed
+        status = [None]
+        header_callback = None
+        if streaming_callback is not None:
+            def header_callback(line):
+                if line.startswith("HTTP/"):
+                    status[0] = int(line.split(" ")[1])
+            def stream(chunk, callback=streaming_callback):
+                stats.count("http.received_bytes", len(chunk))
+                if status[0] not in REDIRECTS:
+                    callback(chunk)
+            streaming_callback = stream
+        for _ in range(self.max_redirects+1):
+            request_headers = {"Cookie": self.cookieHeader()} if self.cookies else {}
+            if body is not None:
+                request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+            request_headers.update(headers or {})
+            request = HTTPRequest(url, method=method, body=body, headers=request_headers,
+                    follow_redirects=False, validate_cert=self.verify, request_timeout=self.timeout,
+                    streaming_callback=streaming_callback, header_callback=header_callback)
+            response = await self.client.fetch(request, raise_error=False)
+            if response.code == 599:
+                raise response.error
+            self._updateCookies(response.headers)
+            if response.body:
+                stats.count("http.received_bytes", len(response.body))
+
+            # follow redirects (changing to GET, as browsers do)
+            location = response.headers.get("Location")
+            if not allow_redirects or response.code not in REDIRECTS or location is None:
+                break
+            url = urljoin(url, location)
+            if response.code in (301, 302, 303):
+                method, body = "GET", None
+        self._time(key, start)
+        return Response(response, url)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, data=None, **kwargs):
+        return await self.request("POST", url, data=data or {}, **kwargs)
+
+    async def download(self, url, path):
+        """
+        Streams the response body into a file (e.g. for binary project files).
+        """
+        with open(path, "wb") as f:
+            response = await self.get(url, streaming_callback=f.write)
+        return response
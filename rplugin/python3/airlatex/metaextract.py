@@ -0,0 +1,89 @@
+import re
+import html
+from codecs import getincrementaldecoder
+
+_attribute = re.compile(r'([\w-]+)\s*=\s*"([^"]*)"')
+
+# the entities html-escaped json consists of ("&amp;" is replaced last)
+_entities = (("&quot;", '"'), ("&#34;", '"'), ("&#x27;", "'"), ("&#39;", "'"), ("&lt;", "<"), ("&gt;", ">"))
+
+
+def unescape(text):
+    """
+    html.unescape, with a fast path for the few entities the server uses.
+    """
+    if "&" not in text:
+        return text
+    fast = text
+    for entity, char in _entities:
+        if entity in fast:
+            fast = fast.replace(entity, char)
+    if fast.count("&") != fast.count("&amp;"):
+        return html.unescape(text)
+    return fast.replace("&amp;", "&")
+
+
+class MetaExtractor:
+
+    def __init__(self, names):
+        """
+        Finds <meta name="..." content="..."> tags of the given names in html fed in chunks.
+        - text outside of meta tags is dropped, an unfinished tag is collected in pieces
+        - `feed` returns True once all tags have been found (the rest can be skipped)
+        - only the content attributes of the wanted tags are unescaped
+        """
+        self.names = set(names)
+        self.found = {}
+        self.tail = ""
+        self.tag = None
+        self.decoder = getincrementaldecoder("utf8")(errors="replace")
+
+    def done(self):
+        return len(self.found) == len(self.names)
+
+    def feed(self, chunk):
+        if isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+
+        # continue an unfinished tag (only the new chunk needs to be searched)
+        if self.tag is not None:
+            end = chunk.find(">")
+            if end < 0:
+                self.tag.append(chunk)
+                return False
+            self.tag.append(chunk[:end])
+            self._tag("".join(self.tag))
+            self.tag = None
+            chunk = chunk[end+1:]
+        else:
+            chunk = self.tail + chunk
+
+        pos = 0
+        self.tail = ""
+        while not self.done():
+            start = chunk.find("<meta", pos)
+            if start < 0:
+
+                # keep what could be the beginning of a tag
+                self.tail = chunk[max(pos, len(chunk)-4):]
+                break
+            end = chunk.find(">", start)
+            if end < 0:
+                self.tag = [chunk[start:]]
+                break
+            self._tag(chunk[start:end])
+            pos = end + 1
+        return self.done()
+
+    def _tag(self, tag):
+
+        # check the name before looking at (possibly huge) content attributes
+        name_pos = tag.find('name="')
+        if name_pos < 0:
+            return
+        name = tag[name_pos+6:tag.find('"', name_pos+6)]
+        if name not in self.names:
+            return
+        attributes = dict(_attribute.findall(tag))
+        if "content" in attributes:
+            self.found[name] = unescape(attributes["content"])
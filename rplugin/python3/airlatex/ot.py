@@ -0,0 +1,151 @@
+# Operations on overleaf's text ops.
+# An op is a list of components {"p": pos, "i": str} (insert) or {"p": pos, "d": str} (delete),
+# that are applied one after another.
+
+
+def appendOp(ops, c):
+    """
+    Appends the component c to ops, merging it into the last component if both are adjacent.
+    """
+    if c.get("i") == "" or c.get("d") == "":
+        return
+    if ops:
+        last = ops[-1]
+
+        # typing: insert inside/at the end of the last insert
+        if "i" in last and "i" in c and last["p"] <= c["p"] <= last["p"]+len(last["i"]):
+            k = c["p"] - last["p"]
+            ops.pop()
+            appendOp(ops, {"p": last["p"], "i": last["i"][:k] + c["i"] + last["i"][k:]})
+            return
+
+        # backspace / delete: last deletion lies inside/at the border of this one
+        if "d" in last and "d" in c and c["p"] <= last["p"] <= c["p"]+len(c["d"]):
+            k = last["p"] - c["p"]
+            ops.pop()
+            appendOp(ops, {"p": c["p"], "d": c["d"][:k] + last["d"] + c["d"][k:]})
+            return
+
+        # deleting (parts of) the last insert: only the remainders of both are kept
+        if "i" in last and "d" in c and c["p"] < last["p"]+len(last["i"]) and last["p"] < c["p"]+len(c["d"]):
+            lp, cp = last["p"], c["p"]
+            p = min(lp, cp)
+            ops.pop()
+            appendOp(ops, {"p": p, "d": c["d"][:max(lp-cp, 0)] + c["d"][lp+len(last["i"])-cp:]})
+            appendOp(ops, {"p": p, "i": last["i"][:max(cp-lp, 0)] + last["i"][cp+len(c["d"])-lp:]})
+            return
+
+        # inserting at the position of the last delete: drop common prefix/suffix of both
+        if "d" in last and "i" in c and last["p"] == c["p"]:
+            d, i = last["d"], c["i"]
+            k = 0
+            while k < len(d) and k < len(i) and d[k] == i[k]:
+                k += 1
+            m = 0
+            while m < len(d)-k and m < len(i)-k and d[-m-1] == i[-m-1]:
+                m += 1
+            if k or m:
+                ops.pop()
+                appendOp(ops, {"p": c["p"]+k, "d": d[k:len(d)-m]})
+                appendOp(ops, {"p": c["p"]+k, "i": i[k:len(i)-m]})
+                return
+    ops.append(c)
+
+
+def extendOps(ops, new_ops):
+    """
+    Appends all components of new_ops to ops.
+    """
+    for c in new_ops:
+        appendOp(ops, c)
+    return ops
+
+
+def composeOps(ops):
+    """
+    Returns the shortest list of components found that has the same effect as ops
+    (i.e. adjacent components merged & components that cancel each other removed).
+    """
+    return extendOps([], ops)
+
+
+def _transformPosition(p, c, insert_after=False):
+    """
+    Position p after component c has been applied.
+    """
+    if "i" in c:
+        if c["p"] < p or (c["p"] == p and insert_after):
+            return p + len(c["i"])
+        return p
+    if p <= c["p"]:
+        return p
+    if p <= c["p"] + len(c["d"]):
+        return c["p"]
+    return p - len(c["d"])
+
+
+def _transformComponent(dest, c, other, side):
+    """
+    Appends component c transformed against the concurrent component other to dest.
+    (side is "left" or "right" and decides which insert goes first at the same position)
+    """
+    if "i" in c:
+        appendOp(dest, {"p": _transformPosition(c["p"], other, side == "right"), "i": c["i"]})
+
+    # delete vs. insert: the inserted text may split the deletion
+    elif "i" in other:
+        s = c["d"]
+        if c["p"] < other["p"]:
+            appendOp(dest, {"p": c["p"], "d": s[:other["p"]-c["p"]]})
+            s = s[other["p"]-c["p"]:]
+        if s:
+            appendOp(dest, {"p": c["p"] + len(other["i"]), "d": s})
+
+    # delete vs. delete: text deleted by both is removed from c
+    else:
+        if c["p"] >= other["p"] + len(other["d"]):
+            appendOp(dest, {"p": c["p"] - len(other["d"]), "d": c["d"]})
+        elif c["p"] + len(c["d"]) <= other["p"]:
+            appendOp(dest, c)
+        else:
+            d = ""
+            if c["p"] < other["p"]:
+                d = c["d"][:other["p"]-c["p"]]
+            if c["p"] + len(c["d"]) > other["p"] + len(other["d"]):
+                d += c["d"][other["p"]+len(other["d"])-c["p"]:]
+            appendOp(dest, {"p": _transformPosition(c["p"], other), "d": d})
+
+
+def transformOps(left, right):
+    """
+    Transforms two concurrent ops against each other, s.t.
+        apply(apply(doc, left), right') == apply(apply(doc, right), left')
+    Returns (left', right'). At the same position, inserts of left go first.
+    """
+    new_right = []
+    for c in right:
+        new_left = []
+        k = 0
+        while k < len(left):
+            next_c = []
+            _transformComponent(new_left, left[k], c, "left")
+            _transformComponent(next_c, c, left[k], "right")
+            k += 1
+            if len(next_c) == 1:
+                c = next_c[0]
+            elif len(next_c) == 0:
+                new_left += left[k:]
+                c = None
+                break
+
+            # c got split into two components
+            else:
+                l, r = transformOps(left[k:], next_c)
+                new_left += l
+                new_right += r
+                c = None
+                break
+        if c is not None:
+            appendOp(new_right, c)
+        left = new_left
+    return left, new_right
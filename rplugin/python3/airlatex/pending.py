@@ -0,0 +1,112 @@
+from time import monotonic
+from asyncio import get_event_loop, TimeoutError
+
+
+class PendingRequests:
+
+    # number of expired requests whose late answers are still handled
+    late_limit = 64
+
+    def __init__(self, timeout=None, timeouts={}):
+        """
+        Commands sent to the server that await an answer.
+        - every request gets a future that is resolved with the answer
+        - requests are removed when answered, expired or the connection is lost
+        - timeouts are per command name (None: wait forever), default is `timeout`
+        - the last `late_limit` expired requests are remembered, s.t. late answers are still handled
+        - keeps the latency of answered requests per command name
+        """
+        self.timeout = timeout
+        self.timeouts = timeouts
+        self.requests = {}
+        self.late = {}
+        self.latencies = {}
+        self.expired = 0
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __contains__(self, cmd_id):
+        return cmd_id in self.requests
+
+    def get(self, cmd_id):
+        entry = self.requests.get(cmd_id)
+        return entry["request"] if entry is not None else None
+
+    def add(self, cmd_id, request):
+        loop = get_event_loop()
+        future = loop.create_future()
+
+        # nobody has to await the answer (avoids "exception was never retrieved")
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        entry = {"request": request, "future": future, "sent": monotonic(), "timer": None}
+        timeout = self.timeouts.get(request["name"], self.timeout)
+        if timeout is not None:
+            entry["timer"] = loop.call_later(timeout, self._expire, cmd_id)
+        self.requests[cmd_id] = entry
+        return future
+
+    def resolve(self, cmd_id, answer):
+        """
+        Removes the request & resolves its future. Returns the request (None if unknown).
+        """
+        entry = self._pop(cmd_id)
+        if entry is None:
+            entry = self.late.pop(cmd_id, None)
+        if entry is None:
+            return None
+        request = entry["request"]
+
+        # per command latency: count, sum, max
+        latency = monotonic() - entry["sent"]
+        stats = self.latencies.setdefault(request["name"], [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += latency
+        stats[2] = max(stats[2], latency)
+
+        if not entry["future"].done():
+            entry["future"].set_result(answer)
+        return request
+
+    def discard(self, cmd_id):
+        entry = self._pop(cmd_id)
+        if entry is not None:
+            entry["future"].cancel()
+
+    def clear(self):
+        for cmd_id in list(self.requests):
+            self.discard(cmd_id)
+        self.late.clear()
+
+    def stats(self):
+        now = monotonic()
+        return {
+            "outstanding": len(self.requests),
+            "expired": self.expired,
+            "late": len(self.late),
+            "ages": {cmd_id: (e["request"]["name"], now - e["sent"]) for cmd_id, e in self.requests.items()},
+            "latency": {name: {"count": c, "mean": s/c, "max": m} for name, (c, s, m) in self.latencies.items()},
+        }
+
+    # ------- #
+    # helpers #
+    # ------- #
+
+    def _pop(self, cmd_id):
+        entry = self.requests.pop(cmd_id, None)
+        if entry is not None and entry["timer"] is not None:
+            entry["timer"].cancel()
+        return entry
+
+    def _expire(self, cmd_id):
+        entry = self.requests.pop(cmd_id, None)
+        if entry is None:
+            return
+        self.expired += 1
+
+        # answer may still arrive (e.g. joinDoc of a large document)
+        self.late[cmd_id] = entry
+        if len(self.late) > self.late_limit:
+            del self.late[next(iter(self.late))]
+        entry["future"].set_exception(TimeoutError("No answer to '%s' (request %s)." % (entry["request"]["name"], cmd_id)))
@@ -1,35 +1,30 @@
 import pynvim
-from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.ioloop import PeriodicCallback
 from tornado import gen
-from tornado.websocket import websocket_connect
-import re
+from tornado.websocket import websocket_connect, WebSocketClosedError
 from itertools import count
 import json
 from airlatex.util import _genTimeStamp
+from airlatex.ot import extendOps, composeOps, transformOps
+from airlatex.protocol import parseFrame, loads, shorten, Dispatcher
+from airlatex.pending import PendingRequests
+from airlatex.projecttree import ProjectTree
+from airlatex.stats import stats
 import time
 from tornado.locks import Lock, Event
 from logging import DEBUG
 from tornado.httpclient import HTTPRequest
-from asyncio import Queue, wait_for, TimeoutError
+from asyncio import Queue, wait_for, TimeoutError, CancelledError, create_task
 from logging import getLogger
 from asyncio import sleep
 
-codere = re.compile(r"(\d):(?:(\d+)(\+?))?:(?::(?:(\d+)(\+?))?(.*))?")
-# code, await_id, await_mult, answer_id, answer_mult, msg = codere.match(str).groups()
-# code        : m[0]
-# await_id    : m[1]
-# await_mult  : m[2]
-# answer_id   : m[3]
-# answer_mult : m[5]
-# msg         : m[5]
 
 class AirLatexProject:
 
-    def __init__(self, url, project, used_id, sidebar, cookie=None, wait_for=15, validate_cert=True):
+    def __init__(self, url, project, used_id, sidebar, cookie=None, wait_for=15, validate_cert=True, getWebSocketURL=None):
         project["handler"] = self
 
         self.sidebar = sidebar
-        self.ioloop = IOLoop()
         self.used_id = used_id
         self.project = project
         self.url = url
@@ -39,40 +34,79 @@ class AirLatexProject:
         self.url_base = url.split("/")[2]
         self.command_counter = count(1)
         self.ws = None
-        self.requests = {}
+        self.requests = PendingRequests(timeout=self.wait_for, timeouts={
+            # acks of updates may take long, they are awaited in _sendOps
+            "applyOtUpdate": None
+        })
         self.cursors = {}
         self.documents = {}
         self.log = getLogger("AirLatex")
-        self.ops_queue = Queue()
+
+        # reconnection
+        self.getWebSocketURL = getWebSocketURL
+        self.closed = False
+        self.session_ids = []
+        self.joined = False
+        self.reconnect_delay = 1
+        self.reconnect_delay_max = 60
+        self.keep_alive_callback = None
 
     async def start(self):
         self.log.debug("Starting connection to server.")
-        # start tornado event loop & related callbacks
-        IOLoop.current().spawn_callback(self.sendOps_flush)
-        PeriodicCallback(self.keep_alive, 20000).start()
-        await self.connect()
-        await self.ioloop.start()
+        # keep alive pings (stopped when the project is closed)
+        self.keep_alive_callback = PeriodicCallback(self.keep_alive, 20000)
+        self.keep_alive_callback.start()
+
+        # reconnect with exponential backoff until disconnected by the user
+        delay = self.reconnect_delay
+        while True:
+            if await self.connect():
+                delay = self.reconnect_delay
+            if self.closed or self.getWebSocketURL is None:
+                break
+            await self.sidebarMsg("Connection lost. Reconnecting in %i seconds." % delay)
+            await sleep(delay)
+            delay = min(2*delay, self.reconnect_delay_max)
+            try:
+                self.url = await self.getWebSocketURL()
+            except Exception as e:
+                self.log.debug("Could not query websocket url: %s", e)
+        self.keep_alive_callback.stop()
+
+    def write(self, msg):
+        if self.ws is None:
+            return False
+        try:
+            self.ws.write_message(msg)
+        except WebSocketClosedError:
+            self.log.debug("Not connected. Dropping message: %s", msg)
+            return False
+        stats.count("ws.sent_frames")
+        stats.count("ws.sent_bytes", len(msg))
+        return True
 
     async def send(self,message_type,message=None,event=None):
         if message_type == "keep_alive":
             self.log.debug("Send keep_alive.")
-            self.ws.write_message("2::")
+            self.write("2::")
             return
         assert message is not None
         message_content = json.dumps(message) if isinstance(message, dict) else message
         message["event"] = event
         if message_type == "update":
-            self.log.debug("Sending update: "+message_content)
-            self.ws.write_message("5:::"+message_content)
+            self.log.debug("Sending update: %s", message_content)
+            self.write("5:::"+message_content)
         elif message_type == "cmd":
             cmd_id = next(self.command_counter)
             msg = "5:" + str(cmd_id) + "+::" + message_content
-            self.log.debug("Sendng cmd: "+msg)
-            self.requests[str(cmd_id)] = message
-            self.ws.write_message(msg)
+            self.log.debug("Sendng cmd: %s", msg)
+            future = self.requests.add(str(cmd_id), message)
+            if not self.write(msg):
+                self.requests.discard(str(cmd_id))
+            return future
 
     async def sidebarMsg(self, msg):
-        self.log.debug_gui("sidebarMsg: %s" % msg)
+        self.log.debug_gui("sidebarMsg: %s", msg)
         self.project["msg"] = msg
         await self.sidebar.triggerRefresh()
 
@@ -84,19 +118,34 @@ class AirLatexProject:
         if doc_id in self.documents:
             doc = self.documents[doc_id]
             buf = doc["buffer"]
-            self.log.debug_gui("bufferDo cmd="+command)
+            self.log.debug_gui("bufferDo cmd=%s", command)
             if command == "applyUpdate":
                 buf.applyUpdate(data)
             elif command == "write":
                 buf.write(data)
+            elif command == "acknowledge":
+                buf.acknowledge(data)
+            elif command == "resume":
+                buf.resume()
             elif command == "updateRemoteCursor":
                 buf.updateRemoteCursor(data)
+            elif command == "removeRemoteCursor":
+                buf.removeRemoteCursor(data)
 
     async def updateRemoteCursor(self, cursors):
         for cursor in cursors:
+
+            # our own cursor is not shown
+            if cursor.get("id") in self.session_ids:
+                continue
             if "row" in cursor and "column" in cursor and "doc_id" in cursor:
                 await self.bufferDo(cursor["doc_id"], "updateRemoteCursor", cursor)
 
+    async def removeRemoteCursor(self, client_id):
+        cursor = self.cursors.pop(client_id, None)
+        if cursor is not None and "doc_id" in cursor:
+            await self.bufferDo(cursor["doc_id"], "removeRemoteCursor", client_id)
+
     async def updateCursor(self,doc, pos):
         event = Event()
         await self.send("update",{
@@ -108,26 +157,62 @@ class AirLatexProject:
             }]
         }, event=event)
 
-    # wrapper for the ioloop
-    async def sendOps(self, document, content_hash, ops=[]):
-        await self.ops_queue.put((document, content_hash, ops))
+    # wrapper for the event loop
+    # (ops have to be enqueued immediately, as incoming ops are transformed against them)
+    def sendOps(self, document, content_hash, ops=[]):
+        document["ops_queue"].put_nowait((content_hash, ops, time.monotonic()))
 
-    # actual sending of ops
-    async def _sendOps(self, document, content_hash, ops=[]):
+    # moves enqueued ops into the pending buffer of the document
+    def _collectOps(self, document, item=None):
+        items = [item] if item is not None else []
+        while not document["ops_queue"].empty():
+            items.append(document["ops_queue"].get_nowait())
 
-        # append new ops to buffer
-        document["ops_buffer"] += ops
+        for item in items:
 
-        # skip if nothing to do
-        if len(document["ops_buffer"]) == 0:
-            return
+            # wake-up call for the flusher (see transformRemoteOps)
+            if item is None:
+                continue
+            content_hash, ops, queued = item
+            extendOps(document["ops_buffer"], ops)
+
+            # oldest pending change (for the queue wait statistics)
+            document.setdefault("queued", queued)
+
+            # hash belongs to the latest ops only
+            document["content_hash"] = content_hash
+
+    # sendOps whenever events appear in the queue of the document
+    # (one batch per document is in flight, all other ops of the document wait in ops_buffer)
+    # (nothing is sent until the document is joined on the current connection)
+    async def _flushOps(self, document):
+        while True:
+            self._collectOps(document, await document["ops_queue"].get())
+            while document["inflight"] is None and document["joined"]:
+
+                # simplify pending ops & skip if nothing to do
+                document["ops_buffer"] = composeOps(document["ops_buffer"])
+                if len(document["ops_buffer"]) == 0:
+                    document.pop("queued", None)
+                    break
+                await self._sendOps(document)
+
+    # actual sending of ops
+    async def _sendOps(self, document):
 
         # wait if awaiting server response
         event = Event()
         await self.gui_await(True)
 
         # clean buffer for next call
-        ops_buffer, document["ops_buffer"] = document["ops_buffer"], []
+        document["inflight"], document["ops_buffer"] = document["ops_buffer"], []
+        document["inflight_event"] = event
+        content_hash, document["content_hash"] = document["content_hash"], None
+        queued = document.pop("queued", None)
+        if queued is not None:
+            stats.since("ops.queue_wait", queued)
+        stats.count("ops.sent", len(document["inflight"]))
+        stats.count("updates.sent")
 
         # actually send operations
         source = document["_id"]
@@ -139,14 +224,18 @@ class AirLatexProject:
             #     "ts": _genTimeStamp(),
             #     "user_id": self.used_id
             # },
-            "op": ops_buffer,
+            "op": document["inflight"],
             "v": document["version"],
-            "lastV": document["version"]-1,
-            "hash": content_hash # overleaf/web: sends document hash (if it hasn't been sent in the last 5 seconds)
+            "lastV": document["version"]-1
         }
 
+        # overleaf/web: sends document hash (if it hasn't been sent in the last 5 seconds)
+        if content_hash is not None:
+            obj_to_send["hash"] = content_hash
+
         # notify server of local change
-        self.log.debug("Sending %i changes to document %s (ver %i)." % (len(ops_buffer), document["_id"], document["version"]))
+        self.log.debug("Sending %i changes to document %s (ver %i).", len(document["inflight"]), document["_id"], document["version"])
+        sent = time.monotonic()
         await self.send("cmd",{
             "name":"applyOtUpdate",
             "args": [
@@ -156,51 +245,93 @@ class AirLatexProject:
         }, event=event)
 
         # server needs to answer before proceeding
+        # (only this document waits, the others are flushed independently)
         if self.wait_for is None:
-            await event.wait
+            await event.wait()
         else:
             try:
                 await wait_for(event.wait(), timeout=self.wait_for)
             except TimeoutError:
-                await self.disconnect("Error: The server did not answer for %d seconds." % self.wait_for)
-        await self.gui_await(False)
-        self.log.debug(" -> Waiting for server to accept changes  changes to documet %s (ver %i)-> done" % (document["_id"], document["version"]))
-
-    # sendOps whenever events appear in queue
-    # (is only called in constructor)
-    async def sendOps_flush(self):
-
-        # direct sending
-        # async for document, ops in self.ops_queue:
-        #     await self._sendOps(document, ops)
-
-        # collects ops and sends them in a batch, server is ready
-        while True:
-            all_ops = {}
-
-            # await first element
-            document, content_hash, ops = await self.ops_queue.get()
-            if document["_id"] not in all_ops:
-                all_ops[document["_id"]] = ops
+                await self.sidebarMsg("Error: The server did not answer for %d seconds to changes of '%s'." % (self.wait_for, document["name"]))
+                await event.wait()
+        stats.since("ops.ack", sent)
+        if not any(d["inflight"] for d in self.documents.values()):
+            await self.gui_await(False)
+        self.log.debug(" -> Waiting for server to accept changes  changes to documet %s (ver %i)-> done", document["_id"], document["version"])
+
+    # server applied the inflight ops of a document as the given version
+    # (called from the buffer, s.t. it is processed in order with the incoming ops)
+    def acknowledgeOps(self, document, version=None):
+
+        # version increase should be before next event
+        # (the op-less update has already set the version)
+        if version is not None:
+            document["version"] = max(document["version"], version+1)
+        document["inflight"] = None
+
+        # flush next
+        document["inflight_event"].set()
+
+    # resends the inflight ops of a document after reconnecting
+    # (called from the buffer, after all missed updates have been applied)
+    def resumeOps(self, document):
+        document["joined"] = True
+        if document["inflight"] is not None:
+            create_task(self._resendOps(document))
+
+        # ops typed while reconnecting
+        elif document["ops_buffer"] or not document["ops_queue"].empty():
+            document["ops_queue"].put_nowait(None)
+
+    async def _resendOps(self, document):
+        self.log.debug("Resending %i changes to document %s (ver %i).", len(document["inflight"]), document["_id"], document["version"])
+        await self.send("cmd",{
+            "name":"applyOtUpdate",
+            "args": [
+                document["_id"],
+                {
+                    "doc": document["_id"],
+                    "op": document["inflight"],
+                    "v": document["version"],
+                    "lastV": document["version"]-1,
+
+                    # server ignores the update if it got it already before the connection dropped
+                    "dupIfSource": self.session_ids[:-1]
+                }
+            ]
+        }, event=document["inflight_event"])
+
+    # applies the updates missed while being disconnected
+    async def replayUpdates(self, doc_id, updates):
+        document = self.documents[doc_id]
+        inflight = document["inflight"] is not None
+        for update in updates:
+
+            # our inflight ops reached the server before the connection dropped
+            source = update.get("meta", {}).get("source")
+            if inflight and source in self.session_ids[:-1]:
+                inflight = False
+                await self.bufferDo(doc_id, "acknowledge", update["v"])
             else:
-                all_ops[document["_id"]] += ops
-
-            # get also all other elements that are currently in queue
-            num = self.ops_queue.qsize()
-            for i in range(num):
-                document, content_hash, ops = await self.ops_queue.get()
-                if document["_id"] not in all_ops:
-                    all_ops[document["_id"]] = ops
-                else:
-                    all_ops[document["_id"]] += ops
-
-            # apply all ops one after another
-            for doc_id, ops in all_ops.items():
-                document = self.documents[doc_id]
-                await self._sendOps(document, content_hash, ops)
-
-
-
+                await self.bufferDo(doc_id, "applyUpdate", update)
+        await self.bufferDo(doc_id, "resume", None)
+
+    # transforms incoming ops against the local ops the server does not know about yet
+    # (called from the buffer, right before the ops are applied)
+    def transformRemoteOps(self, document, ops):
+        self._collectOps(document)
+
+        # ops taken from the queue are not seen by the waiting flusher => wake it up
+        if document["ops_buffer"] and document["inflight"] is None:
+            document["ops_queue"].put_nowait(None)
+        if document["inflight"]:
+            document["inflight"], ops = transformOps(document["inflight"], ops)
+        if document["ops_buffer"] and ops:
+            document["ops_buffer"], ops = transformOps(document["ops_buffer"], ops)
+
+            # hash was computed without these ops
+            document["content_hash"] = None
+        return ops
 
     async def joinDocument(self, buffer):
 
@@ -208,42 +339,85 @@ class AirLatexProject:
         doc = buffer.document
         doc["buffer"] = buffer
 
+        # document opened again => the old flusher waits on a queue that is replaced
+        old = self.documents.get(doc["_id"])
+        if old is not None and "flusher" in old:
+            old.pop("flusher").cancel()
+
         # register document in project_handler
         self.documents[doc["_id"]] = doc
 
-        # register document op-buffer
+        # register document op-buffers
         self.documents[doc["_id"]]["ops_buffer"] = []
+        self.documents[doc["_id"]]["inflight"] = None
+        self.documents[doc["_id"]]["content_hash"] = None
+        self.documents[doc["_id"]]["ops_queue"] = Queue()
+        self.documents[doc["_id"]]["joined"] = False
+        self.documents[doc["_id"]]["flusher"] = create_task(self._flushOps(doc))
 
         # regester for document-watching
-        await self.send("cmd",{
+        answer = await self.send("cmd",{
             "name":"joinDoc",
             "args": [
                 doc["_id"],
                 {"encodeRanges": True}
             ]
         })
+        await self.watchRequest(answer, "joining '%s'" % doc["name"])
+
+    # shows an error if the server does not answer a request in time
+    # (answers of a lost connection are not waited for)
+    async def watchRequest(self, answer, description):
+        if answer is None:
+            return
+        try:
+            await answer
+        except TimeoutError:
+            await self.sidebarMsg("Error: The server did not answer for %d seconds to %s." % (self.wait_for, description))
+        except CancelledError:
+            pass
 
     async def disconnect(self, msg="Disconnected."):
         # del self.project["handler"]
-        self.log.debug("Connection Closed. Reason:" + msg)
+        self.log.debug("Connection Closed. Reason: %s", msg)
+        self.closed = True
+        if self.ws is not None:
+            self.ws.close()
+        if self.keep_alive_callback is not None:
+            self.keep_alive_callback.stop()
+
+        # nothing can be sent anymore
+        for document in self.documents.values():
+            if "flusher" in document:
+                document.pop("flusher").cancel()
         self.project["msg"] = msg
         self.project["open"] = False
         self.project["connected"] = False
         await self.sidebar.triggerRefresh()
-        # await self.ioloop.stop()
 
+    # returns after the connection has been closed (False if it could not be established)
     async def connect(self):
         try:
             await self.sidebarMsg("Connecting Websocket.")
             self.project["connected"] = True
-            self.log.debug("Initializing websocket connection to "+self.url)
+            self.log.debug("Initializing websocket connection to %s", self.url)
             request = HTTPRequest(self.url, headers={'Cookie': self.cookie}, validate_cert=self.validate_cert)
             self.ws = await websocket_connect(request)
         except Exception as e:
             await self.sidebarMsg("Connection Error: "+str(e))
+            return False
         else:
+            # answers to requests of the old connection will not arrive
+            self.requests.clear()
             await self.sidebarMsg("Connected.")
-            await self.run()
+            try:
+                await self.run()
+            finally:
+
+                # documents have to be rejoined before sending again
+                for document in self.documents.values():
+                    document["joined"] = False
+            return True
 
     async def run(self):
         try:
@@ -252,19 +426,24 @@ class AirLatexProject:
 
                 if msg is None:
                     break
-                self.log.debug("Raw server answer: "+msg)
+                stats.count("ws.received_frames")
+                stats.count("ws.received_bytes", len(msg))
+                stats.observe("ws.frame_size", len(msg))
+                if self.log.isEnabledFor(DEBUG):
+                    self.log.debug("Raw server answer: %s", shorten(msg))
 
                 # parse the code
-                code, await_id, await_mult, answer_id, answer_mult, data = codere.match(msg).groups()
+                code, msg_id, endpoint, answer_id, data = parseFrame(msg)
                 if data:
                     try:
-                        data = json.loads(data)
+                        data = loads(data)
                     except:
                         data = {"name":"error"}
 
-                # error occured
+                # server closes the connection => reconnect
                 if code == "0":
-                    await self.disconnect("Error: The server closed the connection.")
+                    self.log.debug("The server closed the connection.")
+                    self.ws.close()
 
                 # first message
                 elif code == "1":
@@ -272,104 +451,31 @@ class AirLatexProject:
 
                 # keep alive
                 elif code == "2":
-                    self.keep_alive()
+                    await self.keep_alive()
 
                 # server request
                 elif code == "5":
                     if not isinstance(data,dict):
-                        pass
-
-                    # connection accepted => join Project
-                    if data["name"] == "connectionAccepted":
-                        await self.sidebarMsg("Connection Active.")
-                        await self.send("cmd",{"name":"joinProject","args":[{"project_id":self.project["id"]}]})
-
-                    # broadcastDocMeta => we ignore it at first
-                    elif data["name"] == "broadcastDocMeta":
-                        pass
-
-                    # client Connected => delete from cursor list
-                    elif data["name"] == "clientTracking.clientUpdated":
-                        for cursor in data["args"]:
-                            if "id" in cursor and cursor["id"] in self.cursors:
-                                self.cursors[cursor["id"]].update(cursor)
-                        await self.updateRemoteCursor(data["args"])
-
-                    # client Disconnected => delete from cursor list
-                    elif data["name"] == "clientTracking.clientDisconnected":
-                        for id in data["args"]:
-                            if id in self.cursors:
-                                del self.cursors[id]
-                        await self.updateRemoteCursor(data["args"])
-
-                    # update applied => apply update to buffer
-                    elif data["name"] == "otUpdateApplied":
-
-                        # nothing to do?
-                        if "args" not in data:
-                            return
-
-                        # apply update to buffer
-                        for op in data["args"]:
-                            await self.bufferDo(op["doc"], "applyUpdate", op)
-
-                    # error occured
-                    elif data["name"] == "otUpdateError":
-                        await self.disconnect("Error occured on operation Update: " + data["args"][0])
-
-                    # unknown message
+                        continue
+                    handler = self.events.get(data.get("name"))
+                    if handler is None:
+                        await self.sidebarMsg("Data not known: "+shorten(msg))
                     else:
-                        await self.sidebarMsg("Data not known: "+msg)
+                        await handler(self, data.get("args", []))
 
                 # answer to our request
                 elif code == "6":
 
                     # get request command
-                    request = self.requests[answer_id]
-                    cmd = request["name"]
-
-                    # joinProject => server lists project information
-                    if cmd == "joinProject":
-                        project_info = data[1]
-                        if self.log.level == DEBUG:
-                            self.log.debug(json.dumps(project_info))
-                        self.project.update(project_info)
-                        self.project["open"] = True
-                        await self.send("cmd",{"name":"clientTracking.getConnectedUsers"})
-                        await self.sidebar.triggerRefresh()
-
-                    elif cmd == "joinDoc":
-                        id = request["args"][0]
-                        self.documents[id]["version"] = data[2]
-                        await self.bufferDo(id, "write", [d.encode("latin1").decode("utf8") for d in data[1]])
-
-                    elif cmd == "applyOtUpdate":
-                        id = request["args"][0]
-
-                        # version increase should be before next event
-                        self.documents[id]["version"] += 1
-
-                        # flush next
-                        request["event"].set()
-
-                        # remove awaiting request
-                        del self.requests[answer_id]
-
-                    elif cmd == "clientTracking.getConnectedUsers":
-                        for cursor in data[1]:
-                            if "cursorData" in cursor:
-                                cursorData = cursor["cursorData"]
-                                del cursor["cursorData"]
-                                cursor.update(cursorData)
-                            self.cursors[cursor["client_id"]] = cursor
-                        await self.updateRemoteCursor(data[1])
-
-                    elif cmd == "clientTracking.updatePosition":
-                        # server accepted the change
-                        del self.requests[answer_id]
-
+                    request = self.requests.resolve(answer_id, data)
+                    if request is None:
+                        self.log.debug("Answer to unknown request %s.", answer_id)
+                        continue
+                    handler = self.answers.get(request["name"])
+                    if handler is None:
+                        await self.sidebarMsg("Data not known:"+shorten(msg))
                     else:
-                        await self.sidebarMsg("Data not known:"+str(msg))
+                        await handler(self, answer_id, request, data)
 
                 # answer to our request
                 elif code == "7":
@@ -377,13 +483,189 @@ class AirLatexProject:
 
                 # unknown message
                 else:
-                    await self.sidebarMsg("Unknown Code:"+str(msg))
+                    await self.sidebarMsg("Unknown Code:"+shorten(msg))
         except (gen.Return, StopIteration):
             raise
         except Exception as e:
             await self.sidebarMsg("Error: "+type(e).__name__+": "+str(e))
             raise
 
+    # ---------------------------------- #
+    # events sent by the server (code 5) #
+    # ---------------------------------- #
+
+    events = Dispatcher()
+
+    # connection accepted => join Project
+    @events.on("connectionAccepted")
+    async def _onConnectionAccepted(self, args):
+
+        # our id, as set in meta.source of our updates
+        self.session_ids.append(args[1] if len(args) > 1 else self.url.split("/")[-1])
+
+        await self.sidebarMsg("Connection Active.")
+        answer = await self.send("cmd",{"name":"joinProject","args":[{"project_id":self.project["id"]}]})
+        create_task(self.watchRequest(answer, "joining the project"))
+
+    # broadcastDocMeta => we ignore it at first
+    @events.on("broadcastDocMeta")
+    async def _onBroadcastDocMeta(self, args):
+        pass
+
+    # client moved its cursor => update cursor list
+    @events.on("clientTracking.clientUpdated")
+    async def _onClientUpdated(self, args):
+        for cursor in args:
+            if "id" not in cursor:
+                continue
+
+            # cursor moved to another document
+            known = self.cursors.get(cursor["id"], {})
+            if known.get("doc_id") not in (None, cursor.get("doc_id")):
+                await self.bufferDo(known["doc_id"], "removeRemoteCursor", cursor["id"])
+
+            known.update(cursor)
+            self.cursors[cursor["id"]] = known
+            await self.updateRemoteCursor([known])
+
+    # client Disconnected => delete from cursor list
+    @events.on("clientTracking.clientDisconnected")
+    async def _onClientDisconnected(self, args):
+        for id in args:
+            await self.removeRemoteCursor(id)
+
+    # update applied => apply update to buffer
+    @events.on("otUpdateApplied")
+    async def _onOtUpdateApplied(self, args):
+        for op in args:
+            await self.bufferDo(op["doc"], "applyUpdate", op)
+
+    # project structure changed => update tree in place
+    @events.on("reciveNewDoc")
+    async def _onNewDoc(self, args):
+        await self._updateTree(self.project["tree"].add(args[0], args[1], "file"))
+
+    @events.on("reciveNewFolder")
+    async def _onNewFolder(self, args):
+        await self._updateTree(self.project["tree"].add(args[0], args[1], "folder"))
+
+    @events.on("reciveNewFile")
+    async def _onNewFile(self, args):
+        await self._updateTree(self.project["tree"].add(args[0], args[1], "fileRef"))
+
+    @events.on("removeEntity")
+    async def _onRemoveEntity(self, args):
+        await self._updateTree(self.project["tree"].remove(args[0]))
+
+    @events.on("reciveEntityRename")
+    async def _onEntityRename(self, args):
+        await self._updateTree(self.project["tree"].rename(args[0], args[1]))
+
+    @events.on("reciveEntityMove")
+    async def _onEntityMove(self, args):
+        await self._updateTree(self.project["tree"].move(args[0], args[1]))
+
+    async def _updateTree(self, node):
+        if node is None:
+            self.log.debug("Project structure event for unknown entity.")
+            return
+        await self.sidebar.triggerRefresh()
+
+    # error occured
+    @events.on("otUpdateError")
+    async def _onOtUpdateError(self, args):
+        await self.disconnect("Error occured on operation Update: " + args[0])
+
+    # -------------------------------- #
+    # answers to our requests (code 6) #
+    # -------------------------------- #
+
+    answers = Dispatcher()
+
+    # joinProject => server lists project information
+    @answers.on("joinProject")
+    async def _onJoinProject(self, answer_id, request, data):
+        project_info = data[1]
+        if self.log.isEnabledFor(DEBUG):
+            self.log.debug("%s", json.dumps(project_info))
+
+        # folder structure (keeps open folders & documents when reconnecting)
+        self.project["tree"] = ProjectTree(project_info.pop("rootFolder")[0], self.project.get("tree"))
+
+        # reconnected => rejoin documents at their current version
+        # (project["open"] is the expanded state in the sidebar & says nothing about the connection)
+        if self.joined:
+            for doc_id, document in self.documents.items():
+
+                # documents that have not been joined successfully are joined anew
+                version = [document["version"]] if "version" in document else []
+                await self.send("cmd",{
+                    "name":"joinDoc",
+                    "args": [doc_id] + version + [{"encodeRanges": True}]
+                })
+        else:
+            self.project.update(project_info)
+            self.project["open"] = True
+            self.joined = True
+        await self.send("cmd",{"name":"clientTracking.getConnectedUsers"})
+        await self.sidebar.triggerRefresh()
+
+    @answers.on("joinDoc")
+    async def _onJoinDoc(self, answer_id, request, data):
+        id = request["args"][0]
+
+        # rejoined => apply updates since our version
+        if len(request["args"]) == 3:
+            if data[0] is not None:
+                await self.sidebarMsg("Error: Could not rejoin '%s': %s" % (self.documents[id]["name"], str(data[0])))
+            else:
+                await self.replayUpdates(id, data[3])
+        else:
+            self.documents[id]["version"] = data[2]
+            self.documents[id]["joined"] = True
+
+            # lines are sent as utf8 bytes in latin1 (decoded at once, lines contain no newlines)
+            await self.bufferDo(id, "write", "\n".join(data[1]).encode("latin1").decode("utf8").split("\n"))
+
+            # collaborators already in the document
+            await self.updateRemoteCursor([c for c in self.cursors.values() if c.get("doc_id") == id])
+
+    # the update has been queued by the server, it is acknowledged once applied (see otUpdateApplied)
+    @answers.on("applyOtUpdate")
+    async def _onApplyOtUpdate(self, answer_id, request, data):
+        if data and data[0] is not None:
+            await self.disconnect("Error occured on operation Update: " + str(data[0]))
+
+    @answers.on("clientTracking.getConnectedUsers")
+    async def _onGetConnectedUsers(self, answer_id, request, data):
+        if data[0] is not None or not isinstance(data[1], list):
+            return
+        connected = {}
+        for cursor in data[1]:
+            if "cursorData" in cursor:
+                cursorData = cursor["cursorData"]
+                del cursor["cursorData"]
+                cursor.update(cursorData)
+
+            # same fields as in clientUpdated
+            cursor["id"] = cursor["client_id"]
+            cursor.setdefault("name", " ".join(filter(None, [cursor.get("first_name"), cursor.get("last_name")])) or cursor.get("email", "?"))
+            connected[cursor["id"]] = cursor
+
+        # clients that left (or changed the document) while we were disconnected
+        for id, known in list(self.cursors.items()):
+            if id not in connected or known.get("doc_id") != connected[id].get("doc_id"):
+                await self.removeRemoteCursor(id)
+        self.cursors.update(connected)
+        await self.updateRemoteCursor(list(connected.values()))
+
+    @answers.on("clientTracking.updatePosition")
+    async def _onUpdatePosition(self, answer_id, request, data):
+        # server accepted the change
+        pass
+
     async def keep_alive(self):
         await self.send("keep_alive")
+        if self.log.isEnabledFor(DEBUG):
+            self.log.debug("Pending requests: %s", self.requests.stats())
 
@@ -0,0 +1,62 @@
+import os
+import json
+import tempfile
+from os.path import expanduser, join
+from logging import getLogger
+
+# the project details shown in the sidebar (everything else is not kept)
+FIELDS = ("id", "_id", "name", "lastUpdated", "lastUpdatedBy", "owner", "source", "accessLevel", "archived", "trashed")
+VERSION = 1
+
+
+class ProjectCache:
+
+    def __init__(self, domain, directory=None):
+        """
+        Last known project list of a domain, kept on disk s.t. the sidebar
+        can be drawn before the session has logged in.
+        - only the fields needed by the sidebar are stored
+        - the file is replaced atomically & only written if the list changed
+        """
+        if directory is None:
+            directory = join(os.environ.get("XDG_CACHE_HOME") or expanduser("~/.cache"), "airlatex")
+        self.directory = directory
+        self.path = join(directory, "projects_%s.json" % "".join(c if c.isalnum() or c in ".-" else "_" for c in domain))
+        self.domain = domain
+        self.saved = None
+        self.log = getLogger("AirLatex")
+
+    def load(self):
+        """
+        Returns the cached project list (None if there is none or it is unreadable).
+        """
+        try:
+            with open(self.path, encoding="utf8") as f:
+                text = f.read()
+            data = json.loads(text)
+            if data.get("version") != VERSION or data.get("domain") != self.domain or not isinstance(data.get("projects"), list):
+                return None
+        except (OSError, ValueError, AttributeError) as e:
+            self.log.debug("No project list cached in '%s': %s", self.path, e)
+            return None
+        self.saved = text
+        return data["projects"]
+
+    def save(self, projectList, user_id=None):
+        projects = [{key: project[key] for key in FIELDS if key in project} for project in projectList]
+        text = json.dumps({"version": VERSION, "domain": self.domain, "user_id": user_id, "projects": projects})
+        if text == self.saved:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".projects")
+            try:
+                with os.fdopen(fd, "w", encoding="utf8") as f:
+                    f.write(text)
+                os.replace(tmp, self.path)
+            except OSError:
+                os.unlink(tmp)
+                raise
+            self.saved = text
+        except OSError as e:
+            self.log.debug("Could not cache the project list in '%s': %s", self.path, e)
@@ -0,0 +1,123 @@
+class Node:
+    __slots__ = ("id", "name", "type", "parent", "folders", "docs", "fileRefs", "open", "data")
+
+    def __init__(self, entity, type, parent=None):
+        """
+        Folder, document ("file") or other file ("fileRef") of a project.
+        `data` is the entity as sent by the server. For documents it also
+        holds the document state while the document is opened.
+        """
+        self.id = entity["_id"]
+        self.name = entity["name"]
+        self.type = type
+        self.parent = parent
+        self.open = False
+        self.data = entity
+        if type == "folder":
+            self.folders, self.docs, self.fileRefs = [], [], []
+        else:
+            self.folders = self.docs = self.fileRefs = None
+
+    def path(self):
+        """
+        Nodes from the top level folder down to this node (root folder excluded).
+        """
+        path = []
+        node = self
+        while node.parent is not None:
+            path.append(node)
+            node = node.parent
+        return path[::-1]
+
+    def children(self, type):
+        return {"folder": self.folders, "file": self.docs, "fileRef": self.fileRefs}[type]
+
+
+class ProjectTree:
+
+    def __init__(self, rootFolder, previous=None):
+        """
+        Folder structure of a project, built once from the joinProject answer
+        and updated in place by the project-structure events of the server.
+        - nodes are indexed by their id
+        - `version` increases with every change, s.t. renderings can be cached
+        - if a `previous` tree is given, open folders & document states are kept
+        """
+        self.index = {}
+        self.version = 0
+        self.root = self._build(rootFolder, "folder", None, previous)
+
+    def _build(self, entity, type, parent, previous=None):
+        node = Node(entity, type, parent)
+        old = previous.index.get(node.id) if previous is not None else None
+        if old is not None:
+            node.open = old.open
+            if type == "file":
+                old.data.update(entity)
+                node.data = old.data
+        self.index[node.id] = node
+        if type == "folder":
+            for folder in entity.get("folders", []):
+                node.folders.append(self._build(folder, "folder", node, previous))
+            for doc in entity.get("docs", []):
+                node.docs.append(self._build(doc, "file", node, previous))
+            for file in entity.get("fileRefs", []):
+                node.fileRefs.append(self._build(file, "fileRef", node, previous))
+        return node
+
+    def _remove(self, node):
+        self.index.pop(node.id, None)
+        if node.type == "folder":
+            for child in node.folders + node.docs + node.fileRefs:
+                self._remove(child)
+
+    def get(self, id):
+        return self.index.get(id)
+
+    # ------- #
+    # changes #
+    # ------- #
+
+    def add(self, folder_id, entity, type):
+        """
+        Adds a new entity to a folder. Returns the node (None if the folder is unknown).
+        """
+        folder = self.index.get(folder_id)
+        if folder is None or folder.type != "folder" or entity["_id"] in self.index:
+            return None
+        node = self._build(entity, type, folder)
+        folder.children(type).append(node)
+        self.version += 1
+        return node
+
+    def remove(self, id):
+        node = self.index.get(id)
+        if node is None or node.parent is None:
+            return None
+        node.parent.children(node.type).remove(node)
+        self._remove(node)
+        self.version += 1
+        return node
+
+    def rename(self, id, name):
+        node = self.index.get(id)
+        if node is None:
+            return None
+        node.name = node.data["name"] = name
+        self.version += 1
+        return node
+
+    def move(self, id, folder_id):
+        node = self.index.get(id)
+        folder = self.index.get(folder_id)
+        if node is None or folder is None or folder.type != "folder" or node.parent is None:
+            return None
+        node.parent.children(node.type).remove(node)
+        folder.children(node.type).append(node)
+        node.parent = folder
+        self.version += 1
+        return node
+
+    def toggle(self, node):
+        node.open = not node.open
+        self.version += 1
@@ -0,0 +1,67 @@
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+
+# socket.io v0.9 frame: code:[id[+]]:[endpoint][:data]
+# (answers to our requests carry their id in the data field: 6:::id+[args])
+def parseFrame(msg):
+    """
+    Splits a frame into (code, msg_id, endpoint, answer_id, data) without regex.
+    Missing fields are empty strings, data is not decoded.
+    """
+    code = msg[:1]
+
+    # fast path: no id & no endpoint (events & acks)
+    if msg[1:4] == ":::":
+        msg_id, endpoint, data = "", "", msg[4:]
+    else:
+        id_end = msg.find(":", 2)
+        if id_end < 0:
+            return code, msg[2:], "", "", ""
+        msg_id = msg[2:id_end].rstrip("+")
+
+        endpoint_end = msg.find(":", id_end+1)
+        if endpoint_end < 0:
+            return code, msg_id, msg[id_end+1:], "", ""
+        endpoint = msg[id_end+1:endpoint_end]
+        data = msg[endpoint_end+1:]
+
+    # answer id prefix of acks
+    answer_id = ""
+    if code == "6":
+        plus = data.find("+")
+        if plus < 0:
+            answer_id, data = data, ""
+        elif data[:plus].isdigit():
+            answer_id, data = data[:plus], data[plus+1:]
+    return code, msg_id, endpoint, answer_id, data
+
+
+def shorten(msg, limit=200):
+    """
+    Truncates long frames (e.g. whole documents) for logging.
+    """
+    if len(msg) <= limit:
+        return msg
+    return "%s... (%i chars)" % (msg[:limit], len(msg))
+
+
+class Dispatcher:
+
+    def __init__(self):
+        """
+        Registry mapping event/command names to handlers.
+        Handlers are registered in the class body using the decorator returned by `on`.
+        """
+        self.handlers = {}
+
+    def on(self, name):
+        def register(fn):
+            self.handlers[name] = fn
+            return fn
+        return register
+
+    def get(self, name):
+        return self.handlers.get(name)
@@ -1,16 +1,17 @@
-import html
 import pynvim
 import keyring
-import requests
 import json
 import time
 import tempfile
 from threading import Thread, currentThread
 from asyncio import Lock, sleep, create_task
+from time import monotonic
 from queue import Queue
 from os.path import expanduser
 import re
 from airlatex.project_handler import AirLatexProject
+from airlatex.httpclient import HTTPClient
+from airlatex.metaextract import MetaExtractor
 from airlatex.util import _genTimeStamp
 from http.cookiejar import CookieJar
 from logging import getLogger
@@ -34,11 +35,16 @@ class AirLatexSession:
         self.https = True if https else False
         self.url = ("https://" if https else "http://") + domain
         self.authenticated = False
-        self.httpHandler = requests.Session()
-        self.httpHandler.verify=False if self.nvim.eval("g:AirLatexAllowInsecure") == 1 else True
+        self.httpHandler = HTTPClient(verify=False if self.nvim.eval("g:AirLatexAllowInsecure") == 1 else True)
         self.projectList = []
         self.log = getLogger("AirLatex")
 
+        # project page (dashboard) & the metadata found in it, reused for `page_ttl` seconds
+        self.page_ttl = 60
+        self.project_page = None
+        self.project_page_time = 0
+        self.project_meta = None
+
         self.wait_for = self.nvim.eval("g:AirLatexWebsocketTimeout")
         self.username = self.nvim.eval("g:AirLatexUsername")
 
@@ -58,6 +64,44 @@ class AirLatexSession:
             await sleep(0.1)
             i += 1
 
+    async def _getProjectPage(self, force=False):
+        """
+        Fetches the project page, unless fetched within the last `page_ttl` seconds.
+        The page is scanned only until the meta tags with the project list & user id are found,
+        the remaining chunks are dropped as they arrive.
+        """
+        if force or self.project_page is None or monotonic() - self.project_page_time > self.page_ttl:
+            extractor = MetaExtractor(["ol-projects", "ol-user_id"])
+            chunks = []
+            def onChunk(chunk):
+                if not extractor.done():
+                    chunks.append(chunk)
+                    extractor.feed(chunk)
+            projectPage = await self.httpHandler.get(self.url + "/project", allow_redirects=False, streaming_callback=onChunk)
+
+            # keep what has been read (for the error messages)
+            projectPage.body = b"".join(chunks)
+            self.project_page = projectPage
+            self.project_page_time = monotonic()
+            if projectPage.ok and "ol-projects" in extractor.found:
+                self.project_meta = {"projects": extractor.found["ol-projects"], "user_id": extractor.found.get("ol-user_id")}
+            else:
+                self.project_meta = None
+        return self.project_page
+
+    def invalidateProjectPage(self):
+        self.project_page = None
+        self.project_meta = None
+
+    def _getProjectMeta(self, projectPage):
+        """
+        The (unescaped) project list & the user id found in the project page.
+        Returns None if the page does not contain the project list.
+        """
+        if projectPage is not self.project_page:
+            return None
+        return self.project_meta
+
     async def _getWebSocketURL(self):
         """
         Query websites websocket meta information to be used for further connections.
@@ -68,11 +112,10 @@ class AirLatexSession:
 
             # To establish a websocket connection
             # the client must query for a sec url
-            self.httpHandler.get(self.url + "/project")
-            channelInfo = self.httpHandler.get(self.url + "/socket.io/1/?t="+timestamp)
-            self.log.debug("Websocket channelInfo '%s'"%channelInfo.text)
+            channelInfo = await self.httpHandler.get(self.url + "/socket.io/1/?t="+timestamp)
+            self.log.debug("Websocket channelInfo '%s'", channelInfo.text)
             wsChannel = channelInfo.text[0:channelInfo.text.find(":")]
-            self.log.debug("Websocket wsChannel '%s'"%wsChannel)
+            self.log.debug("Websocket wsChannel '%s'", wsChannel)
             return ("wss://" if self.https else "ws://") + self.domain + "/socket.io/1/websocket/"+wsChannel
 
 
@@ -85,9 +128,10 @@ class AirLatexSession:
         Disconnects all connected AirLatexProjects.
         """
         self.log.debug("cleanup()")
+        self.invalidateProjectPage()
         for p in self.projectList:
             if "handler" in p:
-                p["handler"].disconnect()
+                create_task(p["handler"].disconnect())
             p["connected"] = False
         create_task(self.sidebar.updateStatus(msg))
 
@@ -103,8 +147,8 @@ class AirLatexSession:
                 anim_status = create_task(self._makeStatusAnimation("Login"))
 
                 # get csrf token
-                loginpage_request = lambda: self.httpHandler.get(self.url + "/login")
-                loginpage = await self.nvim.loop.run_in_executor(None, loginpage_request)
+                loginpage = await self.httpHandler.get(self.url + "/login")
+                csrf = None
                 if loginpage.ok:
                     csrf_input = re.search('<input\s[^>]*name="_csrf"[^>]*>', loginpage.text)
                     csrf = re.search('value="([^"]*)"',csrf_input[0])[1] if csrf_input else None
@@ -117,8 +161,7 @@ class AirLatexSession:
                     }
                     if csrf is not None:
                         data["_csrf"] = csrf
-                    login = lambda: self.httpHandler.post(self.url + "/login", data=data)
-                    login_response = await self.nvim.loop.run_in_executor(None, login)
+                    login_response = await self.httpHandler.post(self.url + "/login", data=data)
                     anim_status.cancel()
                     if not login_response.ok:
                         with tempfile.NamedTemporaryFile(delete=False) as f:
@@ -136,14 +179,14 @@ class AirLatexSession:
                     if "=" not in c:
                         raise ValueError("Cookie has no value. Found: %s" % c)
                     name, value = c.split("=", 1)
-                    self.log.debug("Found Cookie for domain '%s' named '%s'" % (name, value))
+                    self.log.debug("Found Cookie for domain '%s' named '%s'", name, value)
                     self.httpHandler.cookies[name] = value
 
             anim_status = create_task(self._makeStatusAnimation("Connecting"))
             # check if cookie found by testing if projects redirects to login page
+            # (the page is reused for the project list)
             try:
-                get = lambda: self.httpHandler.get(self.url + "/project", allow_redirects=False)
-                redirect = await self.nvim.loop.run_in_executor(None, get)
+                redirect = await self._getProjectPage(force=True)
                 anim_status.cancel()
                 if redirect.ok:
 
@@ -151,7 +194,7 @@ class AirLatexSession:
                     await self.updateProjectList()
                     return True
                 else:
-                    self.log.debug("Could not fetch '%s/project'. Response chain: %s" % (self.url, str(redirect)))
+                    self.log.debug("Could not fetch '%s/project'. Response chain: %s", self.url, redirect)
                     with tempfile.NamedTemporaryFile(delete=False) as f:
                         f.write(redirect.text.encode())
                         create_task(self.sidebar.updateStatus("Connection failed: I could not retrieve the project list. You can check the response page under: %s" % f.name))
@@ -162,7 +205,7 @@ class AirLatexSession:
         else:
             return False
 
-    async def updateProjectList(self):
+    async def updateProjectList(self, force=False):
         """
         Retrieves project list.
         """
@@ -170,12 +213,12 @@ class AirLatexSession:
         if self.authenticated:
             anim_status = create_task(self._makeStatusAnimation("Loading Projects"))
 
-            get = lambda: self.httpHandler.get(self.url + "/project", allow_redirects=False)
-            projectPage = (await self.nvim.loop.run_in_executor(None, get))
+            projectPage = await self._getProjectPage(force)
             anim_status.cancel()
 
-            meta = re.search('<meta\s[^>]*name="ol-projects"[^>]*>', projectPage.text) if projectPage.ok else None
-            if not projectPage.ok or meta is None:
+            meta = self._getProjectMeta(projectPage)
+            if meta is None:
+                self.invalidateProjectPage()
                 with tempfile.NamedTemporaryFile(delete=False) as f:
                     f.write(projectPage.text.encode())
                     self.authenticated = False
@@ -185,16 +228,18 @@ class AirLatexSession:
                 return []
 
             try:
-                project_data_escaped = re.search('content="([^"]*)"',meta[0])[1]
-                data = html.unescape(project_data_escaped)
-                self.log.debug("project_data="+data)
+                data = meta["projects"]
+                self.log.debug("project_data=%s", data)
                 data = json.loads(data)
-                self.user_id = re.search('content="([^"]*)"',re.search('<meta\s[^>]*name="ol-user_id"[^>]*>', projectPage.text)[0])[1]
+                self.user_id = meta["user_id"]
+                if self.user_id is None:
+                    raise ValueError("user id not found")
                 create_task(self.sidebar.updateStatus("Online"))
-                self.log.debug(data)
+                self.log.debug("%s", data)
 
                 self.projectList = data
                 self.projectList.sort(key=lambda p: p["lastUpdated"], reverse=True)
+                self.sidebar.cacheProjectList(self.projectList, self.user_id)
                 create_task(self.sidebar.triggerRefresh())
             except Exception as e:
 
@@ -214,8 +259,8 @@ class AirLatexSession:
 
         # start connection
         anim_status.cancel()
-        cookie_str = "; ".join(name + "=" + value for name, value in self.httpHandler.cookies.get_dict().items())
-        airlatexproject = AirLatexProject(await self._getWebSocketURL(), project, self.user_id, self.sidebar, cookie=cookie_str, wait_for=self.wait_for, validate_cert=self.httpHandler.verify)
+        cookie_str = self.httpHandler.cookieHeader()
+        airlatexproject = AirLatexProject(await self._getWebSocketURL(), project, self.user_id, self.sidebar, cookie=cookie_str, wait_for=self.wait_for, validate_cert=self.httpHandler.verify, getWebSocketURL=self._getWebSocketURL)
         create_task(airlatexproject.start())
 
 
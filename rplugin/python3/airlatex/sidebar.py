@@ -1,7 +1,10 @@
 import pynvim
-from time import gmtime, strftime
-from asyncio import Queue, Lock, sleep, create_task
+from time import gmtime, strftime, monotonic
+from asyncio import Queue, sleep, create_task
 from airlatex.documentbuffer import DocumentBuffer
+from airlatex.projecttree import Node
+from airlatex.projectcache import ProjectCache
+from airlatex.stats import stats
 from logging import getLogger, NOTSET
 from airlatex.util import __version__, pynvimCatchException
 
@@ -14,17 +17,34 @@ class SideBar:
         self.airlatex = airlatex
         self.lastUpdate = gmtime()
         self.buffer = None
-        self.buffer_write_i = 0
         self.cursorPos = []
         self.log = getLogger("AirLatex")
         self.log.debug_gui("SideBar initialized.")
         self.cursor = (2,0)
 
+        # render model: lines & their positions (as shown in the buffer)
+        self.lines = []
+        self.positions = []
+        self.rendered = None
+        self.status_row = None
+        self.hovered = None
+        self.info_lengths = {}
+        self.structure_cache = {}
+
         self.symbol_open=self.nvim.eval("g:AirLatexArrowOpen")
         self.symbol_closed=self.nvim.eval("g:AirLatexArrowClosed")
         self.showArchived = self.nvim.eval("g:AirLatexShowArchived")
         self.status = "Initializing"
-        self.uilock = Lock()
+
+        # last known project list (shown until the session has loaded the projects)
+        self.projectCache = ProjectCache(self.nvim.eval("g:AirLatexDomain")) if self.nvim.eval("g:AirLatexProjectCache") else None
+        self.cachedProjects = None
+
+        # render scheduling: requests are collected & drawn at most once per frame
+        self.frame_interval = 1 / 30
+        self.dirty = set()
+        self.render_handle = None
+        self.last_render = 0
 
 
 
@@ -33,17 +53,42 @@ class SideBar:
     # ----------- #
 
     async def triggerRefresh(self, all=True):
-        self.log.debug_gui("trying to acquire (in trigger)")
-        await self.uilock.acquire()
-        self.log.debug_gui("triggerRefresh() -> event called")
-        self.nvim.async_call(self.listProjects, all)
+        self.log.debug_gui("triggerRefresh()")
+        self.scheduleRender("refresh")
+
+    async def triggerCursorMove(self):
+        self.log.debug_gui("triggerCursorMove()")
+        self.scheduleRender("cursor")
 
     async def updateStatus(self, msg):
-        self.log.debug_gui("trying to acquire (in update)")
-        await self.uilock.acquire()
-        self.status = msg
         self.log.debug_gui("updateStatus()")
-        self.nvim.async_call(self.updateStatusLine)
+        self.status = msg
+        self.scheduleRender("status")
+
+    def scheduleRender(self, kind):
+        """
+        Marks the sidebar dirty & draws it with the next frame (never blocks).
+        """
+        self.dirty.add(kind)
+        if self.render_handle is None:
+            delay = max(0, self.last_render + self.frame_interval - monotonic())
+            self.render_handle = self.nvim.loop.call_later(delay, self.nvim.async_call, self.render)
+
+    @pynvimCatchException
+    def render(self):
+        self.render_handle = None
+        self.last_render = monotonic()
+        dirty, self.dirty = self.dirty, set()
+
+        # a full redraw includes cursor & status
+        if "refresh" in dirty:
+            self._listProjects(True)
+        else:
+            if "cursor" in dirty:
+                self.cursorMoved()
+            if "status" in dirty:
+                self.updateStatusLine()
+        stats.since("sidebar.render", self.last_render)
 
 
 
@@ -52,28 +97,59 @@ class SideBar:
     # ----------- #
 
     @pynvimCatchException
-    def updateStatusLine(self, releaseLock=True):
-        if hasattr(self,'statusline') and len(self.statusline):
-            # self.nvim.command('setlocal ma')
-            self.statusline[0] = self.statusline[0][:15] + self.status
-            # self.nvim.command('setlocal noma')
-            if releaseLock and self.uilock.locked():
-                self.uilock.release()
+    def updateStatusLine(self):
+        if self.status_row is not None and self.rendered is not None:
+            line = self.rendered[self.status_row][:15] + self.status
+            if line != self.rendered[self.status_row]:
+                self.rendered[self.status_row] = line
+                self.buffer.api.set_lines(self.status_row, self.status_row+1, False, [line])
 
-    @pynvimCatchException
     def bufferappend(self, arg, pos=[]):
-        if self.buffer_write_i >= len(self.buffer):
-            self.buffer.append(arg)
-        else:
-            self.buffer[self.buffer_write_i] = arg
-        self.buffer_write_i += 1
-        if self.buffer_write_i == self.cursor[0]:
+        self.lines.append(arg)
+        self.positions.append(pos)
+        if len(self.lines) == self.cursor[0]:
             self.cursorPos = pos
 
+    def bufferextend(self, lines, positions):
+        start = len(self.lines)
+        self.lines.extend(lines)
+        self.positions.extend(positions)
+        if start < self.cursor[0] <= len(self.lines):
+            self.cursorPos = self.positions[self.cursor[0]-1]
+
+    @pynvimCatchException
+    def pushLines(self):
+        """
+        Writes the changed range of the rendered lines to the buffer (one call).
+        """
+        new = self.lines
+        old = self.rendered
+
+        # unknown buffer content => overwrite everything
+        if old is None:
+            self.buffer.api.set_lines(0, -1, False, new)
+            self.rendered = list(new)
+            return
+
+        # skip common prefix & suffix
+        start = 0
+        end = min(len(old), len(new))
+        while start < end and old[start] == new[start]:
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while old_end > start and new_end > start and old[old_end-1] == new[new_end-1]:
+            old_end -= 1
+            new_end -= 1
+
+        if start < old_end or start < new_end:
+            self.buffer.api.set_lines(start, old_end, False, new[start:new_end])
+            self.rendered = list(new)
+
     def initGUI(self):
         self.log.debug_gui("initGUI()")
+        if self.projectCache is not None and not self.airlatex.session and self.cachedProjects is None:
+            self.cachedProjects = self.projectCache.load()
         self.initSidebarBuffer()
-        create_task(self.uilock.acquire())
         self._listProjects(False)
 
     @pynvimCatchException
@@ -89,6 +165,7 @@ class SideBar:
         """)
 
         self.buffer = self.nvim.current.buffer
+        self.rendered = None
 
         self.nvim.command('file AirLatex')
         self.nvim.command('setlocal winfixwidth')
@@ -111,39 +188,50 @@ class SideBar:
 
         # Register Mappings
         self.nvim.command("nnoremap <silent> <buffer> q :q <enter>")
-        self.nvim.command("nnoremap <silent> <buffer> <up> <up> <bar> :call AirLatex_SidebarRefresh() <enter> <bar> <right>")
-        self.nvim.command("nnoremap <silent> <buffer> k <up> <bar> :call AirLatex_SidebarRefresh() <enter> <bar> <right>")
-        self.nvim.command("nnoremap <silent> <buffer> <down> <down> <bar> :call AirLatex_SidebarRefresh() <enter> <bar> <right>")
-        self.nvim.command("nnoremap <silent> <buffer> j <down> <bar> :call AirLatex_SidebarRefresh() <enter> <bar> <right>")
+        self.nvim.command("nnoremap <silent> <buffer> <up> <up> <bar> :call AirLatex_SidebarCursor() <enter> <bar> <right>")
+        self.nvim.command("nnoremap <silent> <buffer> k <up> <bar> :call AirLatex_SidebarCursor() <enter> <bar> <right>")
+        self.nvim.command("nnoremap <silent> <buffer> <down> <down> <bar> :call AirLatex_SidebarCursor() <enter> <bar> <right>")
+        self.nvim.command("nnoremap <silent> <buffer> j <down> <bar> :call AirLatex_SidebarCursor() <enter> <bar> <right>")
         self.nvim.command("nnoremap <silent> <enter> :call AirLatex_ProjectEnter() <enter>")
         self.nvim.command("autocmd VimLeavePre <buffer> :call AirLatex_Close()")
         self.nvim.command("nnoremap <silent> <buffer> d :call AirLatex_ProjectLeave() <enter>")
         self.nvim.command("nnoremap <silent> <buffer> D :call AirLatex_ProjectLeave() <enter>")
 
+    def cacheProjectList(self, projectList, user_id=None):
+        """
+        Replaces the cached projects by the list loaded by the session.
+        """
+        self.cachedProjects = None
+        if self.projectCache is not None:
+            self.projectCache.save(projectList, user_id)
+
     @pynvimCatchException
     def listProjects(self, overwrite=False):
         self._listProjects(overwrite)
 
     def _listProjects(self, overwrite=False):
-        self.log.debug_gui("listProjects(%s)" % str(overwrite))
+        self.log.debug_gui("listProjects(%s)", overwrite)
+        list_start = monotonic()
         if self.buffer == self.nvim.current.window.buffer:
             self.cursor = self.nvim.current.window.cursor
 
         # self.nvim.command('setlocal ma')
         self.cursorPos = []
+        self.lines = []
+        self.positions = []
+        self.hovered = None
+        self.info_lengths = {}
         if self.airlatex.session:
             projectList = self.airlatex.session.projectList
         else:
             projectList = []
             self.status = "Starting Session"
+        if not projectList and self.cachedProjects:
+            projectList = self.cachedProjects
 
         # Display Header
-        if not overwrite or True:
-            self.buffer_write_i = 0
-            self.bufferappend("   ┄┄┄┄┄┄ AirLatex (ver %s) ┄┄┄┄┄┄┄ " % __version__)
-            self.bufferappend(" ")
-        else:
-            self.buffer_write_i = 4
+        self.bufferappend("   ┄┄┄┄┄┄ AirLatex (ver %s) ┄┄┄┄┄┄┄ " % __version__)
+        self.bufferappend(" ")
 
         # Display all Projects
         if projectList is not None:
@@ -159,83 +247,159 @@ class SideBar:
                     continue
 
                 # list project structure
-                if "open" in project and project["open"]:
+                if "open" in project and project["open"] and "tree" in project:
                     self.bufferappend(" "+self.symbol_open+" "+project["name"], pos)
-                    self.listProjectStructure(project["rootFolder"][0], pos)
+                    self.bufferextend(*self.listProjectStructure(project))
                 else:
                     self.bufferappend(" "+self.symbol_closed+" "+project["name"], pos)
 
                 # cursor-over info
-                if self.cursorAt([project]):
-                    if "open" in project and project["open"]:
-                        self.bufferappend("   -----------------")
-                if "msg" in project and ("connected" in project and project["connected"] or self.cursorAt([project]) or "msg" in project and project["msg"].startswith("Error")):
-                    if project["msg"].startswith("Error: "):
-                        self.bufferappend("   error: "+project['msg'][7:])
-                    else:
-                        self.bufferappend("   msg: "+project['msg'])
-                if self.cursorAt([project]):
-                    if "await" not in project:
-                        self.bufferappend("   awaits: [enter to connect]")
-                    else:
-                        self.bufferappend("   awaits: "+("↑" if not project["await"] else "↓"))
-                    if "source" in project:
-                        self.bufferappend("   source: "+project['source'])
-                    if "owner" in project:
-                        self.bufferappend("   owner: "+project['owner']['first_name']+(" "+project['owner']['last_name'] if "last_name" in project["owner"] else ""))
-                    if "lastUpdated" in project:
-                        self.bufferappend("   last change: "+project['lastUpdated'])
-                    if not (project["lastUpdatedBy"] == None):
-                        self.bufferappend("    -> by: " + 
-                                project['lastUpdatedBy']['first_name'] + 
-                                " " + 
-                                " " + 
-                                project['lastUpdatedBy']['last_name'])
+                hovered = self.cursorAt([project])
+                info = self.projectInfo(project, hovered)
+                if hovered:
+                    self.hovered = (project, len(self.lines), len(info))
+                self.info_lengths[id(project)] = len(self.projectInfo(project, False)) if hovered else len(info)
+                for line in info:
+                    self.bufferappend(line)
 
         # Info
         self.bufferappend("  ")
         self.bufferappend("  ")
         self.bufferappend("  ")
         self.bufferappend(" Retry       : enter", ["retry"])
+        self.status_row = len(self.lines)
         self.bufferappend(" Status      : %s" % self.status, ["status"])
-        self.statusline = self.buffer.range(self.buffer_write_i, self.buffer_write_i+1)
-        self.updateStatusLine(releaseLock=False)
         self.bufferappend(" Last Update : "+strftime("%H:%M:%S",self.lastUpdate), ["lastupdate"])
         self.bufferappend(" Quit All    : enter", ["disconnect"])
+
+        # write changed lines only
+        self.pushLines()
         if not overwrite:
             self.vimCursorSet(3,1)
-        del(self.buffer[self.buffer_write_i:len(self.buffer)])
+        stats.since("sidebar.list", list_start)
         # self.nvim.command('setlocal noma')
 
-        if self.uilock.locked():
-            self.uilock.release()
+    def projectInfo(self, project, hovered):
+        """
+        Lines shown below a project (details only if hovered by the cursor).
+        """
+        lines = []
+        if hovered:
+            if "open" in project and project["open"]:
+                lines.append("   -----------------")
+        if "msg" in project and ("connected" in project and project["connected"] or hovered or "msg" in project and project["msg"].startswith("Error")):
+            if project["msg"].startswith("Error: "):
+                lines.append("   error: "+project['msg'][7:])
+            else:
+                lines.append("   msg: "+project['msg'])
+        if hovered:
+            if "await" not in project:
+                lines.append("   awaits: [enter to connect]")
+            else:
+                lines.append("   awaits: "+("↑" if not project["await"] else "↓"))
+            if "source" in project:
+                lines.append("   source: "+project['source'])
+            if "owner" in project:
+                lines.append("   owner: "+project['owner']['first_name']+(" "+project['owner']['last_name'] if "last_name" in project["owner"] else ""))
+            if "lastUpdated" in project:
+                lines.append("   last change: "+project['lastUpdated'])
+            if project.get("lastUpdatedBy") is not None:
+                lines.append("    -> by: " +
+                        project['lastUpdatedBy']['first_name'] +
+                        " " +
+                        " " +
+                        project['lastUpdatedBy']['last_name'])
+        return lines
+
+    def replaceLines(self, start, end, lines, pos=[]):
+        """
+        Replaces rows of the model & the buffer in place (without rendering).
+        """
+        self.lines[start:end] = lines
+        self.positions[start:end] = [pos]*len(lines)
+        self.rendered[start:end] = lines
+        if self.status_row is not None and self.status_row >= end:
+            self.status_row += len(lines) - (end - start)
+        self.buffer.api.set_lines(start, end, False, lines)
 
     @pynvimCatchException
-    def listProjectStructure(self, rootFolder, pos, indent=0):
-        self.log.debug_gui("listProjectStructure()")
+    def cursorMoved(self):
+        """
+        Shows the details of the newly hovered project & hides those of the previous one.
+        Only the detail lines are touched, the cost does not depend on the number of projects.
+        """
+        if self.rendered is None or self.buffer != self.nvim.current.window.buffer:
+            return self._listProjects(True)
+        self.cursor = self.nvim.current.window.cursor
+        row = self.cursor[0]-1
+
+        # still within the hovered project
+        if self.hovered is not None:
+            project, start, length = self.hovered
+            if row < start and self.positions[row] and self.positions[row][0] is project:
+                self.cursorPos = self.positions[row]
+                return
+
+        # the cursor stays at its row, whatever is there after hiding the old details gets hovered
+        # (as in a full redraw)
+        if self.hovered is not None:
+            project, start, length = self.hovered
+            self.hovered = None
+            info = self.projectInfo(project, False)
+            self.info_lengths[id(project)] = len(info)
+            self.replaceLines(start, start+length, info)
+
+        self.cursorPos = self.positions[row] if row < len(self.positions) else []
+        if self.cursorPos and isinstance(self.cursorPos[0], dict):
+            project = self.cursorPos[0]
+
+            # details follow the project structure
+            start = row
+            while start < len(self.positions) and self.positions[start] and self.positions[start][0] is project:
+                start += 1
+            info = self.projectInfo(project, True)
+            self.replaceLines(start, start+self.info_lengths[id(project)], info)
+            self.hovered = (project, start, len(info))
+
+        self.vimCursorSet(*self.cursor)
+
+    def listProjectStructure(self, project):
+        """
+        Lines & positions of the project tree (cached until the tree changes).
+        """
+        tree = project["tree"]
+        cached = self.structure_cache.get(id(project))
+        if cached is None or cached[0] is not tree or cached[1] != tree.version:
+            self.log.debug_gui("listProjectStructure()")
+            lines, positions = [], []
+            self._listFolder(tree.root, project, lines, positions)
+            cached = (tree, tree.version, lines, positions)
+            self.structure_cache[id(project)] = cached
+        return cached[2], cached[3]
+
+    def _listFolder(self, folder, project, lines, positions, indent=0):
 
         # list folders first
         indentStr = "   "+"  "*indent
-        for folder in rootFolder["folders"]:
-            folder["type"] = "folder"
-            if "open" in folder and folder["open"]:
-                self.bufferappend(indentStr+self.symbol_open+" "+folder["name"], pos+[folder])
-                self.listProjectStructure(folder, pos+[folder], indent+1)
-            else:
-                self.bufferappend(indentStr+self.symbol_closed+" "+folder["name"], pos+[folder])
+        for sub in folder.folders:
+            lines.append(indentStr+(self.symbol_open if sub.open else self.symbol_closed)+" "+sub.name)
+            positions.append([project, sub])
+            if sub.open:
+                self._listFolder(sub, project, lines, positions, indent+1)
 
         # list editable files
         indentStr = "   "+"  "*(indent+1)
-        for doc in rootFolder["docs"]:
-            doc["type"] = "file"
-            self.bufferappend(indentStr+doc["name"], pos+[doc])
+        for doc in folder.docs:
+            lines.append(indentStr+doc.name)
+            positions.append([project, doc])
 
         # list files (other files)
-        if len(rootFolder["fileRefs"]) > 0:
-            self.bufferappend("   file Refs:", pos+["fileRefs"])
-            for file in rootFolder["fileRefs"]:
-                file["type"] = "fileRef"
-                self.bufferappend("    - "+file["name"], pos+[file])
+        if len(folder.fileRefs) > 0:
+            lines.append("   file Refs:")
+            positions.append([project, "fileRefs"])
+            for file in folder.fileRefs:
+                lines.append("    - "+file.name)
+                positions.append([project, file])
 
 
     # ------- #
@@ -268,7 +432,7 @@ class SideBar:
 
         # check if all positions match
         for p,c in zip(pos,self.cursorPos):
-            if p != c:
+            if p is not c:
                 return False
         return True
 
@@ -277,7 +441,7 @@ class SideBar:
     def cursorAction(self, key="enter"):
         if not isinstance(self.cursorPos, list):
             return
-        self.log.debug_gui("cursorAction(%s) on %s" % (key, ",".join(str(p) for p in self.cursorPos)))
+        self.log.debug_gui("cursorAction(%s) on %s", key, self.cursorPos)
 
         if len(self.cursorPos) == 0:
             pass
@@ -302,22 +466,23 @@ class SideBar:
                         self._toggle(self.cursorPos[-1], "open", default=False)
                     elif key == "del":
                         if "connected" in project and project["connected"]:
-                            project["handler"].disconnect()
+                            create_task(project["handler"].disconnect())
                     create_task(self.triggerRefresh())
-                else:
+                elif self.airlatex.session:
                     create_task(self.airlatex.session.connectProject(project))
 
-        elif not isinstance(self.cursorPos[-1], dict):
+        elif not isinstance(self.cursorPos[-1], Node):
             pass
 
         # is folder
-        elif self.cursorPos[-1]["type"] == "folder":
-            self._toggle(self.cursorPos[-1], "open")
+        elif self.cursorPos[-1].type == "folder":
+            self.cursorPos[0]["tree"].toggle(self.cursorPos[-1])
             create_task(self.triggerRefresh())
 
         # is file
-        elif self.cursorPos[-1]["type"] == "file":
-            documentbuffer = DocumentBuffer(self.cursorPos, self.nvim)
+        elif self.cursorPos[-1].type == "file":
+            path = [self.cursorPos[0]] + [node.data for node in self.cursorPos[-1].path()]
+            documentbuffer = DocumentBuffer(path, self.nvim)
             create_task(self.cursorPos[0]["handler"].joinDocument(documentbuffer))
 
 
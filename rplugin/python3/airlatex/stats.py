@@ -0,0 +1,147 @@
+import json
+from math import frexp
+from time import time, monotonic, strftime, localtime
+
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        """
+        Distribution of positive values (durations in seconds, sizes in bytes, ...).
+        Values are counted in power-of-two buckets, s.t. adding a value is O(1)
+        and percentiles are exact up to a factor of two.
+        """
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        exponent = frexp(value)[1]
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket containing the p-th percentile (capped by the maximum).
+        """
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for exponent in sorted(self.buckets):
+            seen += self.buckets[exponent]
+            if seen >= rank:
+                return min(2.0 ** exponent, self.max)
+        return self.max
+
+    def asDict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.min or 0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class Stats:
+
+    def __init__(self):
+        """
+        Performance counters of the plugin (shown by :AirLatexStats).
+        - timers: durations of the stages in seconds (diffing, applying, rendering, http, ...)
+        - counters: totals (ops sent/received, bytes on the wire, rpc calls to neovim)
+        - histograms: distributions of other values (e.g. frame sizes)
+        """
+        self.reset()
+
+    def reset(self):
+        self.started = time()
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, duration):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Histogram()
+        timer.add(duration)
+
+    def since(self, name, start):
+        """
+        Records the time passed since `start` (a monotonic() timestamp).
+        """
+        self.record(name, monotonic() - start)
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    def countRequests(self, nvim):
+        """
+        Counts the rpc requests sent to neovim (per api function).
+        """
+        session = getattr(nvim, "_session", None)
+        if session is None or getattr(session, "airlatex_counted", False):
+            return
+        request = session.request
+        def countedRequest(method, *args, **kwargs):
+            self.count("rpc." + method)
+            return request(method, *args, **kwargs)
+        session.request = countedRequest
+        session.airlatex_counted = True
+
+    # ------ #
+    # output #
+    # ------ #
+
+    def snapshot(self):
+        return {
+            "since": self.started,
+            "uptime": time() - self.started,
+            "timers": {name: timer.asDict() for name, timer in sorted(self.timers.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: histogram.asDict() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def format(self):
+        """
+        Lines of a human readable summary (times in ms).
+        """
+        snapshot = self.snapshot()
+        lines = ["AirLatex statistics since %s (%.0f s)" % (strftime("%H:%M:%S", localtime(self.started)), snapshot["uptime"]), ""]
+        columns = ("count", "mean", "p50", "p90", "p99", "max")
+        lines.append("%-36s %8s %9s %9s %9s %9s %9s" % (("timers [ms]",) + columns))
+        for name, t in snapshot["timers"].items():
+            lines.append("%-36s %8i %9.2f %9.2f %9.2f %9.2f %9.2f" % ((name, t["count"]) + tuple(t[c]*1000 for c in columns[1:])))
+        lines += ["", "%-36s %8s %9s %9s %9s %9s %9s" % (("histograms",) + columns)]
+        for name, h in snapshot["histograms"].items():
+            lines.append("%-36s %8i %9.0f %9.0f %9.0f %9.0f %9.0f" % ((name, h["count"]) + tuple(h[c] for c in columns[1:])))
+        lines += ["", "counters"]
+        for name, value in snapshot["counters"].items():
+            lines.append("%-36s %8i" % (name, value))
+        return lines
+
+
+# statistics of the whole plugin
+stats = Stats()
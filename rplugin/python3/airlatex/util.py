@@ -1,7 +1,10 @@
 import time
+import atexit
 import logging
 import traceback
+from queue import SimpleQueue
 from logging import NOTSET
+from logging.handlers import QueueHandler, QueueListener
 
 
 __version__ = "0.2"
@@ -20,16 +23,39 @@ def _genTimeStamp():
 logging_settings={
     "level": "NOTSET",
     "file": "AirLatex.log",
-    "gui": True
+    "gui": True,
+    "queue": False
 }
-
-class CustomLogRecord(logging.LogRecord):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.filename = self.filename.split(".")[0]
-        self.origin = f"{self.filename} / {self.funcName} #{self.lineno:<4}"
+_log_listener = None
+
+class OriginFormatter(logging.Formatter):
+    """
+    Adds the origin (file / function #line) to a record, only when it is written.
+    """
+    def format(self, record):
+        record.origin = "%s / %s #%-4i" % (record.filename.split(".")[0], record.funcName, record.lineno)
+        return super().format(record)
+
+class LogQueueHandler(QueueHandler):
+    """
+    Queues records with the message merged with its arguments (in place, without copying the record).
+    """
+    def prepare(self, record):
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+def _stopLogListener():
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+atexit.register(_stopLogListener)
 
 def init_logger():
+    global _log_listener
     log = logging.getLogger("AirLatex")
 
     # user settings
@@ -40,21 +66,33 @@ def init_logger():
     DEBUG_LEVEL_GUI = 9
     logging.addLevelName(DEBUG_LEVEL_GUI, "DEBUG_GUI")
     def debug_gui(self, message, *args, **kws):
-        if self.isEnabledFor(DEBUG_LEVEL_GUI) and logging_settings["gui"]:
+        if logging_settings["gui"] and self.isEnabledFor(DEBUG_LEVEL_GUI):
             self._log(DEBUG_LEVEL_GUI, message, args, **kws)
     logging.Logger.debug_gui = debug_gui
     logging.DEBUG_GUI = DEBUG_LEVEL_GUI
 
+    # (re-)initialization replaces the handlers
+    _stopLogListener()
+    for h in list(log.handlers):
+        log.removeHandler(h)
+        h.close()
+
     if level != "NOTSET":
 
         # formatter
-        logging.setLogRecordFactory(CustomLogRecord)
-        f = logging.Formatter('%(origin)40s: %(message)s')
+        f = OriginFormatter('%(origin)40s: %(message)s')
 
         # handler
         h = logging.FileHandler(file, "w")
         h.setFormatter(f)
 
+        # file i/o & formatting happen in a background thread
+        # (messages are merged with their arguments before being queued)
+        if logging_settings["queue"]:
+            _log_listener = QueueListener(SimpleQueue(), h)
+            _log_listener.start()
+            h = LogQueueHandler(_log_listener.queue)
+
         # logger settings
         log.addHandler(h)
         log.setLevel(getattr(logging,level))
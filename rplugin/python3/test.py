@@ -21,7 +21,7 @@ if __name__ == "__main__":
     print(">>>>",project)
     session.connectProject(nvim, project)
     time.sleep(2)
-    doc = project["rootFolder"][0]["docs"][0]
+    doc = project["tree"].root.docs[0].data
     doc["handler"] = project["handler"]
     doc = DocumentBuffer([doc], nvim)
     project["handler"].joinDocument(doc)